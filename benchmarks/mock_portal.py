@@ -0,0 +1,309 @@
+import argparse
+import hashlib
+import io
+import json
+import random
+import sys
+import threading
+import time
+import zipfile
+from email.utils import formatdate
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import unquote, urlsplit
+
+SHAPES = {
+    "flat": {"deps": 0, "optional": 0},
+    "tree": {"deps": 2, "optional": 1},
+    "dense": {"deps": 5, "optional": 3},
+}
+
+CATEGORIES = ["content", "tweaks", "utilities", "overhaul", "scenarios", "mod-packs", "localizations", "internal"]
+WORDS = [
+    "belt", "train", "rail", "inserter", "logistic", "robot", "power", "solar", "nuclear", "fluid",
+    "oil", "circuit", "combinator", "turret", "armor", "space", "quality", "recipe", "tech", "map",
+    "ore", "mining", "smelting", "module", "beacon", "chest", "storage", "lamp", "wire", "biter",
+    "enemy", "planet", "rocket", "cargo", "pipe", "pump", "boiler", "steam", "factory", "blueprint"
+]
+
+class Catalog:
+    def __init__(self, size=3000, releases=3, shape="tree", payload=32 * 1024, seed=1):
+        self.payload = payload
+        self.seed = seed
+        self.archives = dict()
+        self.lock = threading.Lock()
+        self.mods = dict()
+        self.etag = f'"{seed}-{size}-{releases}-{shape}"'
+        self.last_modified = formatdate(usegmt=True)
+
+        rng = random.Random(seed)
+        fanout = SHAPES[shape]
+        names = []
+        for i in range(size):
+            words = rng.sample(WORDS, rng.randint(1, 3))
+            name = "-".join(words) + f"-{i}"
+            deps = ["base >= 2.0"]
+            if names:
+                for dep in rng.sample(names[-200:], min(len(names[-200:]), rng.randint(0, fanout["deps"]))):
+                    deps.append(rng.choice([dep, f"{dep} >= 1.0.0"]))
+                for dep in rng.sample(names[-200:], min(len(names[-200:]), rng.randint(0, fanout["optional"]))):
+                    deps.append(f"? {dep}")
+            mod_releases = []
+            for r in range(releases):
+                mod_releases.append({
+                    "version": f"1.{r}.0",
+                    "file_name": f"{name}_1.{r}.0.zip",
+                    "download_url": f"/download/{name}/{r}",
+                    "released_at": f"2024-{1 + r % 12:02d}-01T00:00:00.000000Z",
+                    "info_json": {"factorio_version": "1.1" if r == 0 and releases > 1 else "2.0", "dependencies": deps}
+                })
+            self.mods[name] = {
+                "name": name,
+                "title": " ".join(word.title() for word in words),
+                "owner": f"author{rng.randint(0, size // 10)}",
+                "summary": "Adds " + " ".join(rng.sample(WORDS, 6)),
+                "category": rng.choice(CATEGORIES),
+                "downloads_count": int(rng.paretovariate(1.2) * 100),
+                "releases": mod_releases
+            }
+            names.append(name)
+
+    def popular(self, count):
+        return sorted(self.mods, key=lambda name: self.mods[name]["downloads_count"], reverse=True)[:count]
+
+    def archive(self, name, ver):
+        key = (name, ver)
+        with self.lock:
+            if key in self.archives:
+                return self.archives[key]
+        release = next(r for r in self.mods[name]["releases"] if r["version"] == ver)
+        rng = random.Random(f"{self.seed}/{name}/{ver}")
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, "w", zipfile.ZIP_STORED) as archive:
+            archive.writestr(f"{name}_{ver}/info.json", json.dumps({
+                "name": name,
+                "version": ver,
+                "factorio_version": release["info_json"]["factorio_version"],
+                "dependencies": release["info_json"]["dependencies"]
+            }))
+            archive.writestr(f"{name}_{ver}/data.lua", rng.randbytes(rng.randint(self.payload // 2, self.payload * 3 // 2)))
+        data = buffer.getvalue()
+        with self.lock:
+            self.archives[key] = (data, hashlib.sha1(data).hexdigest())
+        return self.archives[key]
+
+    def release(self, name, release):
+        return dict(release, sha1=self.archive(name, release["version"])[1])
+
+    def entry(self, name, full=False):
+        mod = self.mods[name]
+        entry = {k: v for k, v in mod.items() if k != "releases"}
+        if full:
+            entry["releases"] = [self.release(name, r) for r in mod["releases"]]
+        else:
+            entry["latest_release"] = self.release(name, mod["releases"][-1])
+        return entry
+
+    def listing(self):
+        return {"pagination": {"count": len(self.mods)}, "results": [self.entry(name) for name in self.mods]}
+
+class Faults:
+    def __init__(self, latency=0.0, jitter=0.0, bandwidth=0, failure_rate=0.0, seed=1):
+        self.latency = latency
+        self.jitter = jitter
+        self.bandwidth = bandwidth
+        self.failure_rate = failure_rate
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+
+    def delay(self):
+        with self.lock:
+            extra = self.rng.uniform(0, self.jitter) if self.jitter else 0
+        if self.latency or extra:
+            time.sleep(self.latency + extra)
+
+    def fail(self):
+        if not self.failure_rate:
+            return False
+        with self.lock:
+            return self.rng.random() < self.failure_rate
+
+class Stats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.requests = dict()
+            self.bytes = 0
+            self.failures = 0
+
+    def record(self, endpoint, sent=0, failed=False):
+        with self.lock:
+            self.requests[endpoint] = self.requests.get(endpoint, 0) + 1
+            self.bytes += sent
+            self.failures += failed
+
+    def snapshot(self):
+        with self.lock:
+            return {"requests": dict(self.requests), "bytes": self.bytes, "failures": self.failures}
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def send_body(self, code, body, headers=None, faults=None):
+        self.send_response(code)
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or dict()).items():
+            self.send_header(key, value)
+        self.end_headers()
+        if self.command == "HEAD":
+            return
+        rate = faults.bandwidth if faults is not None else 0
+        if not rate:
+            self.wfile.write(body)
+            return
+        chunk = max(4096, rate // 20)
+        started = time.monotonic()
+        for offset in range(0, len(body), chunk):
+            self.wfile.write(body[offset:offset + chunk])
+            ahead = (offset + chunk) / rate - (time.monotonic() - started)
+            if ahead > 0:
+                time.sleep(ahead)
+
+    def send_json(self, obj, code=200, headers=None):
+        body = json.dumps(obj).encode()
+        self.send_body(code, body, dict(headers or dict(), **{"Content-Type": "application/json"}), self.server.portal_faults)
+
+    def do_HEAD(self):
+        self.do_GET()
+
+    def do_GET(self):
+        path = unquote(urlsplit(self.path).path).strip("/").split("/")
+        if path[:2] == ["api", "mods"]:
+            return self.portal(path[2:])
+        if path[0] in self.server.mirror_faults and len(path) == 3:
+            return self.mirror(path[0], path[1], path[2])
+        self.server.stats.record("other", failed=True)
+        self.send_body(404, b"")
+
+    def portal(self, path):
+        faults = self.server.portal_faults
+        faults.delay()
+        catalog = self.server.catalog
+        if faults.fail():
+            self.server.stats.record("portal", failed=True)
+            return self.send_body(503, b"")
+
+        if not path:
+            if self.headers.get("If-None-Match") == catalog.etag:
+                self.server.stats.record("catalog-304")
+                return self.send_body(304, b"", {"ETag": catalog.etag})
+            body = self.server.listing_body()
+            self.server.stats.record("catalog", len(body))
+            return self.send_body(200, body, {"Content-Type": "application/json", "ETag": catalog.etag, "Last-Modified": catalog.last_modified}, faults)
+
+        name = path[0]
+        if name not in catalog.mods:
+            self.server.stats.record("metadata-404")
+            return self.send_json({"message": "Mod not found"}, 404)
+        full = len(path) > 1 and path[1] == "full"
+        self.server.stats.record("metadata-full" if full else "metadata")
+        self.send_json(catalog.entry(name, full=full))
+
+    def mirror(self, mirror, name, file_name):
+        faults = self.server.mirror_faults[mirror]
+        faults.delay()
+        catalog = self.server.catalog
+        ver = file_name[:-4] if file_name.endswith(".zip") else file_name
+        if name not in catalog.mods or not any(r["version"] == ver for r in catalog.mods[name]["releases"]):
+            self.server.stats.record(f"{mirror}-404")
+            return self.send_body(404, b"")
+        if faults.fail():
+            self.server.stats.record(mirror, failed=True)
+            return self.send_body(503, b"")
+
+        data, _ = catalog.archive(name, ver)
+        byte_range = self.headers.get("Range", "")
+        if byte_range.startswith("bytes="):
+            start, _, end = byte_range[6:].partition("-")
+            start = int(start)
+            end = min(int(end), len(data) - 1) if end else len(data) - 1
+            if start >= len(data):
+                self.server.stats.record(mirror)
+                return self.send_body(416, b"", {"Content-Range": f"bytes */{len(data)}"})
+            self.server.stats.record(mirror, end - start + 1)
+            return self.send_body(206, data[start:end + 1], {"Content-Range": f"bytes {start}-{end}/{len(data)}", "Accept-Ranges": "bytes"}, faults)
+        self.server.stats.record(mirror, len(data))
+        self.send_body(200, data, {"Accept-Ranges": "bytes", "Content-Type": "application/zip"}, faults)
+
+class MockPortal(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, catalog, portal_faults=None, mirror_faults=None, port=0):
+        super().__init__(("127.0.0.1", port), Handler)
+        self.catalog = catalog
+        self.portal_faults = portal_faults or Faults()
+        self.mirror_faults = mirror_faults or {"mirror0": Faults(), "mirror1": Faults()}
+        self.stats = Stats()
+        self.listing = None
+        self.thread = None
+
+    def handle_error(self, request, client_address):
+        if not isinstance(sys.exc_info()[1], (BrokenPipeError, ConnectionResetError)):
+            super().handle_error(request, client_address)
+
+    def listing_body(self):
+        if self.listing is None:
+            self.listing = json.dumps(self.catalog.listing()).encode()
+        return self.listing
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.server_port}"
+
+    @property
+    def portal_url(self):
+        return self.base_url + "/api/mods"
+
+    @property
+    def mirror_urls(self):
+        return [f"{self.base_url}/{mirror}" for mirror in self.mirror_faults]
+
+    def start(self):
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-in for the Mod Portal API and download mirrors")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--mods", type=int, default=3000, help="Number of mods in the synthetic catalog")
+    parser.add_argument("--releases", type=int, default=3, help="Releases per mod")
+    parser.add_argument("--shape", choices=SHAPES, default="tree", help="Dependency graph shape")
+    parser.add_argument("--payload", type=int, default=32 * 1024, help="Average archive payload in bytes")
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds added to every response")
+    parser.add_argument("--bandwidth", type=int, default=0, help="Mirror bandwidth cap in bytes/s (0 = unlimited)")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="Fraction of mirror downloads answered with 503")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    catalog = Catalog(args.mods, args.releases, args.shape, args.payload, args.seed)
+    mirrors = {f"mirror{i}": Faults(args.latency, 0, args.bandwidth, args.failure_rate, args.seed + i) for i in range(2)}
+    server = MockPortal(catalog, Faults(args.latency), mirrors, args.port)
+    print(f"FMD_PORTAL_URL={server.portal_url}")
+    print(f"FMD_MIRRORS={','.join(server.mirror_urls)}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
+
+if __name__ == "__main__":
+    main()
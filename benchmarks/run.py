@@ -0,0 +1,267 @@
+import argparse
+import hashlib
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from mock_portal import Catalog, Faults, MockPortal, SHAPES
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PACK_FILE = "bench_pack.json"
+LOCK_FILE = "bench-lock.json"
+
+PROFILES = {
+    "lan": {"portal": {}, "mirrors": [{}, {}]},
+    "wan": {
+        "portal": {"latency": 0.05, "jitter": 0.02},
+        "mirrors": [
+            {"latency": 0.05, "jitter": 0.02, "bandwidth": 10 * 1024 * 1024},
+            {"latency": 0.08, "jitter": 0.04, "bandwidth": 5 * 1024 * 1024}
+        ]
+    },
+    "flaky": {
+        "portal": {"latency": 0.05, "jitter": 0.05, "failure_rate": 0.02},
+        "mirrors": [
+            {"latency": 0.05, "jitter": 0.05, "bandwidth": 10 * 1024 * 1024, "failure_rate": 0.2},
+            {"latency": 0.2, "jitter": 0.1, "bandwidth": 2 * 1024 * 1024}
+        ]
+    }
+}
+
+SCENARIOS = {
+    "catalog-cold": ([], ("catalog", 0)),
+    "catalog-warm": ([("catalog", 0)], ("catalog", 0)),
+    "catalog-refresh": ([("catalog", 0)], ("refresh", 0)),
+    "search": ([("catalog", 0)], ("search", 0)),
+    "resolve-50": ([("catalog", 0)], ("resolve", 50)),
+    "resolve-300": ([("catalog", 0)], ("resolve", 300)),
+    "resolve-300-warm": ([("catalog", 0), ("resolve", 300)], ("resolve", 300)),
+    "resolve-1000": ([("catalog", 0)], ("resolve", 1000)),
+    "pack-50": ([("catalog", 0)], ("sync", 50)),
+    "pack-300": ([("catalog", 0)], ("sync", 300)),
+    "pack-300-warm": ([("catalog", 0), ("sync", 300)], ("sync", 300)),
+    "pack-1000": ([("catalog", 0)], ("sync", 1000)),
+    "install-300": ([("catalog", 0), ("download", 300)], ("sync", 300)),
+    "locked-300": ([("catalog", 0), ("lock", 300)], ("locked", 300)),
+    "locked-repair-300": ([("catalog", 0), ("lock", 300), ("locked", 300)], ("repair", 300)),
+}
+
+SEARCH_QUERIES = 200
+
+def file_sha1(path):
+    with open(path, "rb") as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+def tamper_installed(store, mods_dir, locked):
+    # Every third mod is replaced by junk that is not in the cache, every third
+    # one by same-sized content with a different SHA-1; both must be reinstalled.
+    tampered = 0
+    for i, mod in enumerate(locked):
+        target = os.path.join(mods_dir, mod["file_name"])
+        if i % 3 == 2 or not os.path.isfile(target):
+            continue
+        with open(target, "rb") as f:
+            data = f.read()
+        os.remove(target)
+        with open(target, "wb") as f:
+            f.write(b"junk" if i % 3 == 0 else data[:-1] + bytes([data[-1] ^ 1]))
+        if i % 3 == 0 and os.path.isfile(store.store_path(mod["sha1"])):
+            os.remove(store.store_path(mod["sha1"]))
+        tampered += 1
+    return tampered
+
+def summary_extra(summary):
+    if summary is None:
+        raise RuntimeError("resolution failed")
+    extra = {key: summary[key] for key in ("resolved", "up_to_date", "downloaded", "installed")}
+    extra["failed"] = len(summary["failed"])
+    extra["timings"] = summary["timings"]
+    return extra
+
+def run_action(action, count):
+    sys.path.insert(0, ROOT)
+    from fmdlib import core, portal, resolver, store, sync
+
+    core.check_dirs()
+    core.factorio_path = os.path.join(os.getcwd(), "factorio")
+    mods_dir = os.path.join(core.factorio_path, "mods")
+    os.makedirs(mods_dir, exist_ok=True)
+    with open(PACK_FILE) as f:
+        pack = json.load(f)[:count]
+
+    extra = dict()
+    if action == "repair":
+        with open(LOCK_FILE) as f:
+            locked = json.load(f)["mods"]
+        extra["tampered"] = tamper_installed(store, mods_dir, locked)
+        sync.flush_caches()
+
+    started = time.perf_counter()
+    if action == "catalog":
+        portal.build_data_cache()
+        extra["mods"] = len(portal.get_catalog())
+    elif action == "refresh":
+        portal.build_data_cache(force_rebuild=True)
+        extra["mods"] = len(portal.get_catalog())
+    elif action == "search":
+        portal.build_data_cache()
+        portal.get_catalog()
+        step = time.perf_counter()
+        portal.get_search_index()
+        extra["index"] = time.perf_counter() - step
+        rng = random.Random(1)
+        names = list(portal.get_catalog().by_name)
+        queries = [rng.choice(names)[:rng.randint(3, 12)].replace("-", " ") for _ in range(SEARCH_QUERIES)]
+        step = time.perf_counter()
+        for query in queries:
+            portal.search(query)
+            portal.suggest(query)
+        extra["queries"] = len(queries)
+        extra["per_query"] = (time.perf_counter() - step) / len(queries)
+    elif action == "resolve":
+        portal.build_data_cache()
+        extra["resolved"] = len(resolver.resolve_mods([resolver.root_dep(name) for name in pack], infos=dict()))
+    elif action in ("sync", "download"):
+        portal.build_data_cache()
+        extra.update(summary_extra(sync.sync_mods(pack, mods_dir=mods_dir, install=action == "sync")))
+    elif action == "lock":
+        portal.build_data_cache()
+        if sync.write_lockfile(pack, LOCK_FILE) is None:
+            raise RuntimeError("resolution failed")
+    elif action in ("locked", "repair"):
+        extra.update(summary_extra(sync.install_locked(LOCK_FILE, mods_dir)))
+    else:
+        raise ValueError(f"unknown action {action}")
+    elapsed = time.perf_counter() - started
+
+    if action in ("locked", "repair"):
+        with open(LOCK_FILE) as f:
+            locked = json.load(f)["mods"]
+        wrong = [mod["file_name"] for mod in locked if not os.path.isfile(os.path.join(mods_dir, mod["file_name"]))
+                 or file_sha1(os.path.join(mods_dir, mod["file_name"])) != mod["sha1"]]
+        if wrong:
+            raise RuntimeError(f"{len(wrong)} installed mods do not match the lockfile: {', '.join(wrong[:5])}")
+
+    sync.flush_caches()
+    print("RESULT " + json.dumps({"seconds": elapsed, "extra": extra}))
+
+def spawn(action, count, cwd, env, verbose):
+    result = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--child", action, "--count", str(count)],
+        cwd=cwd, env=env, capture_output=True, text=True
+    )
+    if verbose:
+        sys.stderr.write(result.stdout + result.stderr)
+    for line in reversed(result.stdout.splitlines()):
+        if line.startswith("RESULT "):
+            return json.loads(line[len("RESULT "):])
+    raise RuntimeError(f"{action} {count} failed:\n{result.stdout[-2000:]}{result.stderr[-2000:]}")
+
+def run_scenario(name, server, pack, repeat, verbose):
+    setup, (action, count) = SCENARIOS[name]
+    env = dict(os.environ, FMD_PORTAL_URL=server.portal_url, FMD_MIRRORS=",".join(server.mirror_urls))
+    runs = []
+    for _ in range(repeat):
+        with tempfile.TemporaryDirectory(prefix="fmd-bench-") as cwd:
+            with open(os.path.join(cwd, PACK_FILE), "w") as f:
+                json.dump(pack, f)
+            for setup_action, setup_count in setup:
+                spawn(setup_action, setup_count, cwd, env, verbose)
+            server.stats.reset()
+            result = spawn(action, count, cwd, env, verbose)
+            result["server"] = server.stats.snapshot()
+            runs.append(result)
+
+    seconds = [run["seconds"] for run in runs]
+    return {
+        "median": statistics.median(seconds),
+        "min": min(seconds),
+        "max": max(seconds),
+        "runs": runs
+    }
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=ROOT, capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+def compare(results, baseline_path):
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    print(f"\n{'scenario':<20} {'baseline':>10} {'current':>10} {'change':>8}")
+    for name, current in results["scenarios"].items():
+        before = baseline.get("scenarios", dict()).get(name)
+        if before is None:
+            continue
+        change = current["median"] / before["median"] - 1 if before["median"] else 0
+        print(f"{name:<20} {before['median']:>9.3f}s {current['median']:>9.3f}s {change:>+7.1%}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline fmd.py benchmarks against a local mock Mod Portal")
+    parser.add_argument("scenarios", nargs="*", help=f"Scenarios to run (default: all of {', '.join(SCENARIOS)})")
+    parser.add_argument("--profile", choices=PROFILES, default="lan", help="Latency, bandwidth and failure profile")
+    parser.add_argument("--mods", type=int, default=3000, help="Size of the synthetic catalog")
+    parser.add_argument("--releases", type=int, default=3, help="Releases per mod")
+    parser.add_argument("--shape", choices=SHAPES, default="tree", help="Dependency graph shape")
+    parser.add_argument("--payload", type=int, default=32 * 1024, help="Average archive payload in bytes")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per scenario")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    parser.add_argument("--compare", help="Compare medians against an earlier results file")
+    parser.add_argument("--verbose", action="store_true", help="Show fmd.py output")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    parser.add_argument("--count", type=int, default=0, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_action(args.child, args.count)
+        return
+
+    unknown = [name for name in args.scenarios if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(unknown)}")
+
+    profile = PROFILES[args.profile]
+    catalog = Catalog(args.mods, args.releases, args.shape, args.payload, args.seed)
+    mirrors = {f"mirror{i}": Faults(seed=args.seed + i, **faults) for i, faults in enumerate(profile["mirrors"])}
+    server = MockPortal(catalog, Faults(seed=args.seed, **profile["portal"]), mirrors).start()
+    pack = catalog.popular(max(count for _, (_, count) in SCENARIOS.values()))
+    server.listing_body()
+
+    results = {
+        "meta": {
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "profile": args.profile,
+            "catalog": {"mods": args.mods, "releases": args.releases, "shape": args.shape, "payload": args.payload, "seed": args.seed},
+            "repeat": args.repeat,
+            "started_at": time.time()
+        },
+        "scenarios": dict()
+    }
+
+    try:
+        for name in args.scenarios or SCENARIOS:
+            result = run_scenario(name, server, pack, args.repeat, args.verbose)
+            results["scenarios"][name] = result
+            requests = sum(result["runs"][-1]["server"]["requests"].values())
+            print(f"{name:<20} median {result['median']:8.3f}s  min {result['min']:8.3f}s  max {result['max']:8.3f}s  ({requests} requests)")
+    finally:
+        server.stop()
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.compare:
+        compare(results, args.compare)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FMD = os.path.join(ROOT, "fmd.py")
+
+IMPORT_BUDGET = 0.15
+COMMAND_BUDGET = 0.40
+HEAVY_MODULES = ("flask", "flask_cors", "werkzeug", "requests", "asyncio")
+
+COMMANDS = {
+    "help": ["help"],
+    "set-path": ["set-path", "does-not-exist"],
+}
+
+def import_profile():
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import fmd"],
+        cwd=ROOT, capture_output=True, text=True, check=True
+    )
+    modules = dict()
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        parts = [part.strip() for part in line[len("import time:"):].split("|")]
+        if not parts[1].isdigit():
+            continue
+        modules[parts[2]] = int(parts[1]) / 1e6
+    return modules
+
+def loaded_modules(args, cwd):
+    code = (
+        "import sys, runpy, json\n"
+        f"sys.argv = {json.dumps([FMD] + args)}\n"
+        f"sys.path.insert(0, {ROOT!r})\n"
+        "try:\n"
+        f"    runpy.run_path({FMD!r}, run_name='__main__')\n"
+        "except SystemExit:\n"
+        "    pass\n"
+        "sys.stderr.write(json.dumps(sorted(sys.modules)))\n"
+    )
+    result = subprocess.run([sys.executable, "-c", code], cwd=cwd, capture_output=True, text=True)
+    return json.loads(result.stderr.strip().splitlines()[-1])
+
+def time_command(args, cwd, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        subprocess.run([sys.executable, FMD] + args, cwd=cwd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        samples.append(time.perf_counter() - started)
+    return samples
+
+def main():
+    parser = argparse.ArgumentParser(description="Startup time regression benchmark for fmd.py")
+    parser.add_argument("--repeat", type=int, default=10, help="Runs per command")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+
+    results = {"budgets": {"import": IMPORT_BUDGET, "command": COMMAND_BUDGET}, "commands": dict(), "failures": []}
+
+    modules = import_profile()
+    results["import"] = modules.get("fmd", sum(modules.values()))
+    results["slowest_imports"] = sorted(modules.items(), key=lambda item: item[1], reverse=True)[:10]
+    if results["import"] > IMPORT_BUDGET:
+        results["failures"].append(f"import fmd took {results['import']:.3f}s (budget {IMPORT_BUDGET}s)")
+
+    with tempfile.TemporaryDirectory() as cwd:
+        for name, command in COMMANDS.items():
+            samples = time_command(command, cwd, args.repeat)
+            heavy = [m for m in loaded_modules(command, cwd) if m.split(".")[0] in HEAVY_MODULES]
+            results["commands"][name] = {
+                "median": statistics.median(samples),
+                "min": min(samples),
+                "max": max(samples),
+                "heavy_modules": sorted({m.split(".")[0] for m in heavy})
+            }
+            if statistics.median(samples) > COMMAND_BUDGET:
+                results["failures"].append(f"{name} took {statistics.median(samples):.3f}s (budget {COMMAND_BUDGET}s)")
+            if heavy:
+                results["failures"].append(f"{name} imported {', '.join(results['commands'][name]['heavy_modules'])}")
+        if os.listdir(cwd):
+            results["failures"].append(f"fast commands created {', '.join(os.listdir(cwd))}")
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print(f"import fmd: {results['import'] * 1000:.1f} ms")
+        for name, module_time in results["slowest_imports"]:
+            print(f"  {name:<40} {module_time * 1000:8.1f} ms")
+        for name, stats in results["commands"].items():
+            print(f"fmd.py {name}: median {stats['median'] * 1000:.1f} ms (min {stats['min'] * 1000:.1f}, max {stats['max'] * 1000:.1f})")
+        for failure in results["failures"]:
+            print(f"FAIL: {failure}")
+
+    sys.exit(1 if results["failures"] else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,327 @@
+import json
+import os
+import threading
+import time
+import traceback
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from . import core, daemon
+from .core import cli, check_factorio_path_set, get_instances
+from .daemon import instance_status, request_instance_sync
+from .download import get_mirror_scheduler
+from .portal import search, suggest
+from .prefetch import prefetch_status, start_prefetcher, stop_prefetcher
+from .resolver import root_dep
+from .store import inflight_downloads, inflight_lock
+from .sync import download_mods, install_set
+from .trace import get_trace_metrics
+
+JOB_WORKERS = 2
+JOB_HISTORY = 100
+
+jobs = OrderedDict()
+jobs_lock = threading.Lock()
+job_executor = None
+flask_app = None
+server_thread = None
+server = None
+
+class Job:
+    def __init__(self, job_id, mods, install=True):
+        self.id = job_id
+        self.mods = mods
+        self.install = install
+        self.status = "queued"
+        self.message = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.mods_total = 0
+        self.mods_done = 0
+        self.mods_failed = []
+        self.bytes = 0
+        self.expected_bytes = 0
+        self.files = dict()
+        self.installed = False
+        self.version = 0
+        self.condition = threading.Condition()
+
+    def update(self, **changes):
+        with self.condition:
+            for key, value in changes.items():
+                setattr(self, key, value)
+            self.version += 1
+            self.condition.notify_all()
+
+    def add_bytes(self, count):
+        with self.condition:
+            self.bytes += count
+            self.version += 1
+            self.condition.notify_all()
+
+    def add_expected(self, count):
+        with self.condition:
+            self.expected_bytes += count
+
+    def resolved(self, names):
+        self.update(status="downloading", mods_total=len(names))
+
+    def downloaded(self, name, file_name):
+        with self.condition:
+            self.mods_done += 1
+            if file_name is None:
+                self.mods_failed.append(name)
+            self.version += 1
+            self.condition.notify_all()
+
+    def failed(self, message):
+        self.update(message=message)
+
+    @property
+    def finished(self):
+        return self.status in ("done", "failed")
+
+    def snapshot(self):
+        with self.condition:
+            now = self.finished_at or time.time()
+            elapsed = now - self.started_at if self.started_at else 0
+            eta = None
+            if not self.finished and self.mods_done and self.mods_total > self.mods_done:
+                eta = elapsed / self.mods_done * (self.mods_total - self.mods_done)
+            return {
+                "id": self.id,
+                "mods": self.mods,
+                "status": self.status,
+                "message": self.message,
+                "mods_total": self.mods_total,
+                "mods_done": self.mods_done,
+                "mods_failed": list(self.mods_failed),
+                "bytes": self.bytes,
+                "expected_bytes": self.expected_bytes,
+                "bytes_per_second": self.bytes / elapsed if elapsed > 0 else 0,
+                "elapsed": round(elapsed, 2),
+                "eta": round(eta, 1) if eta is not None else None,
+                "installed": self.installed,
+                "files": dict(self.files),
+                "version": self.version
+            }
+
+    def wait(self, version, timeout=None):
+        with self.condition:
+            self.condition.wait_for(lambda: self.version != version, timeout=timeout)
+        return self.snapshot()
+
+def parse_job_mods(items):
+    mods = []
+    for item in items:
+        if isinstance(item, str):
+            mods.append({"name": item, "version": "latest"})
+        elif isinstance(item, dict) and isinstance(item.get("name"), str):
+            mods.append({"name": item["name"], "version": item.get("version") or "latest"})
+        else:
+            raise ValueError(f"Invalid mod entry: {item!r}")
+    return mods
+
+def run_job(job):
+    job.update(status="resolving", started_at=time.time())
+    try:
+        visited = dict()
+        download_mods([root_dep(mod["name"], mod["version"]) for mod in job.mods], visited_set=visited, progress=job)
+        files = {name: file for name, file in visited.items() if file is not None}
+        if not files:
+            job.update(status="failed", message=job.message or "Failed to resolve mod", files=visited, finished_at=time.time())
+            return
+
+        installed = False
+        if job.install and check_factorio_path_set():
+            job.update(status="installing", files=visited)
+            install_set(visited)
+            installed = True
+        job.update(status="done", files=visited, installed=installed, finished_at=time.time(),
+                   message=None if installed or not job.install else "Downloaded to cache, but Factorio path not set")
+    except Exception as e:
+        cli.print(f"[bold red]Job {job.id} failed:[/bold red] {traceback.format_exc()}")
+        job.update(status="failed", message=str(e), finished_at=time.time())
+
+def submit_job(mods, install=True):
+    global job_executor
+    with jobs_lock:
+        for job in jobs.values():
+            if not job.finished and job.mods == mods and job.install == install:
+                return job
+
+        if job_executor is None:
+            job_executor = ThreadPoolExecutor(max_workers=JOB_WORKERS)
+        job = Job(os.urandom(6).hex(), mods, install)
+        jobs[job.id] = job
+
+        finished = [job_id for job_id, other in jobs.items() if other.finished]
+        for job_id in finished[:max(0, len(finished) - JOB_HISTORY)]:
+            del jobs[job_id]
+
+    job_executor.submit(run_job, job)
+    return job
+
+def get_job(job_id):
+    with jobs_lock:
+        return jobs.get(job_id)
+
+def setup_flask_server():
+    global flask_app, server, server_thread
+    from flask import Flask, Response, jsonify, request as flask_request
+    from flask_cors import CORS
+    from werkzeug.serving import make_server
+
+    flask_app = Flask(__name__)
+    CORS(flask_app)
+        
+    @flask_app.route('/api/download/<mod_name>', methods=['GET'])
+    def api_download(mod_name):
+        try:
+            cli.print(f"\n[bold cyan]Browser requested download: {mod_name}[/bold cyan]")
+            job = submit_job(parse_job_mods([mod_name]))
+            snapshot = job.snapshot()
+            while snapshot["status"] not in ("done", "failed"):
+                snapshot = job.wait(snapshot["version"])
+
+            if snapshot["status"] == "done":
+                result = {
+                    "status": "success",
+                    "mod": mod_name,
+                    "installed": snapshot["installed"],
+                    "files": list(snapshot["files"].values())
+                }
+                if not snapshot["installed"]:
+                    result["message"] = snapshot["message"]
+                return jsonify(result), 200
+            else:
+                return jsonify({"error": snapshot["message"] or "Failed to resolve mod"}), 404
+
+        except Exception as e:
+            cli.print(f"[bold red]API Error:[/bold red] {traceback.format_exc()}")
+            return jsonify({"error": str(e)}), 500
+
+    @flask_app.route('/api/download/<mod_name>', methods=['POST'])
+    @flask_app.route('/api/download/<mod_name>/<mod_version>', methods=['POST'])
+    def api_enqueue_download(mod_name, mod_version="latest"):
+        cli.print(f"\n[bold cyan]Browser queued download: {mod_name} ({mod_version})[/bold cyan]")
+        job = submit_job([{"name": mod_name, "version": mod_version}])
+        return jsonify(job.snapshot()), 202
+
+    @flask_app.route('/api/jobs', methods=['POST'])
+    def api_create_job():
+        body = flask_request.get_json(silent=True) or dict()
+        try:
+            mods = parse_job_mods(body.get("mods", []))
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        if not mods:
+            return jsonify({"error": "No mods given"}), 400
+        cli.print(f"\n[bold cyan]Browser queued {len(mods)} mods[/bold cyan]")
+        job = submit_job(mods, install=bool(body.get("install", True)))
+        return jsonify(job.snapshot()), 202
+
+    @flask_app.route('/api/jobs', methods=['GET'])
+    def api_list_jobs():
+        with jobs_lock:
+            current = list(jobs.values())
+        return jsonify({"jobs": [job.snapshot() for job in current]}), 200
+
+    @flask_app.route('/api/jobs/<job_id>', methods=['GET'])
+    def api_job(job_id):
+        job = get_job(job_id)
+        if job is None:
+            return jsonify({"error": "Unknown job"}), 404
+        return jsonify(job.snapshot()), 200
+
+    @flask_app.route('/api/jobs/<job_id>/events', methods=['GET'])
+    def api_job_events(job_id):
+        job = get_job(job_id)
+        if job is None:
+            return jsonify({"error": "Unknown job"}), 404
+
+        def stream():
+            snapshot = job.snapshot()
+            while True:
+                yield f"data: {json.dumps(snapshot)}\n\n"
+                if snapshot["status"] in ("done", "failed"):
+                    break
+                time.sleep(0.25)
+                snapshot = job.wait(snapshot["version"], timeout=15)
+
+        return Response(stream(), mimetype="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+    def search_result(packet, score=None):
+        result = {
+            "name": packet["name"],
+            "title": packet.get("title", packet["name"]),
+            "owner": packet.get("owner"),
+            "downloads_count": packet.get("downloads_count", 0)
+        }
+        if score is not None:
+            result["score"] = round(score, 4)
+        return result
+
+    @flask_app.route('/api/search', methods=['GET'])
+    def api_search():
+        query = flask_request.args.get("q", "").strip()
+        limit = max(1, min(flask_request.args.get("limit", 10, type=int), 50))
+        if not query:
+            return jsonify({"results": []}), 200
+        return jsonify({"results": [search_result(m, c) for m, c in search(query, max_similar=limit)]}), 200
+
+    @flask_app.route('/api/suggest', methods=['GET'])
+    def api_suggest():
+        query = flask_request.args.get("q", "").strip()
+        limit = max(1, min(flask_request.args.get("limit", 10, type=int), 50))
+        if not query:
+            return jsonify({"results": []}), 200
+        return jsonify({"results": [search_result(m) for m in suggest(query, limit=limit)]}), 200
+
+    @flask_app.route('/api/metrics', methods=['GET'])
+    def api_metrics():
+        mirrors = [dict(stats, mirror=mirror, score=score, estimate=estimate) for mirror, score, estimate, stats in get_mirror_scheduler().report()]
+        with inflight_lock:
+            inflight = len(inflight_downloads)
+        with jobs_lock:
+            states = dict()
+            for job in jobs.values():
+                states[job.status] = states.get(job.status, 0) + 1
+        return jsonify({"spans": get_trace_metrics(), "mirrors": mirrors, "inflight_downloads": inflight, "jobs": states}), 200
+
+    @flask_app.route('/api/instances', methods=['GET'])
+    def api_instances():
+        result = [dict(instance, name=name, status=instance_status.get(name, {"state": "unknown"})) for name, instance in get_instances().items()]
+        return jsonify({"daemon": daemon.daemon_running, "instances": result}), 200
+
+    @flask_app.route('/api/instances/<name>/sync', methods=['POST'])
+    def api_sync_instance(name):
+        if name not in get_instances():
+            return jsonify({"error": "Unknown instance"}), 404
+        if not daemon.daemon_running:
+            return jsonify({"error": "Daemon not running"}), 409
+        request_instance_sync(name)
+        return jsonify({"instance": name, "queued": True}), 202
+
+    @flask_app.route('/api/prefetch', methods=['GET'])
+    def api_prefetch():
+        return jsonify(dict(prefetch_status, top=core.prefetch_top, watchlist=core.prefetch_watchlist)), 200
+
+    @flask_app.route('/api/status', methods=['GET'])
+    def api_status():
+        return jsonify({"status": "running", "factorio_path_set": check_factorio_path_set()}), 200
+    
+    server = make_server('127.0.0.1', 5000, flask_app, threaded=True)
+    server_thread = threading.Thread(target=server.serve_forever, daemon=True)
+    server_thread.start()
+    cli.print("[bold green]API Server started at http://127.0.0.1:5000[/bold green]")
+    start_prefetcher()
+
+def shutdown_flask_server():
+    global server
+    stop_prefetcher()
+    if server:
+        server.shutdown()
+        server = None
+        cli.print("[bold yellow]API Server stopped[/bold yellow]")
@@ -0,0 +1,185 @@
+import json
+import mmap
+import os
+import struct
+import threading
+import zlib
+
+from .core import MOD_FILE_PATTERN, cli
+from .resolver import parse_dep
+from .store import get_file_hash
+from .trace import span
+
+VALIDATION_FILE = os.path.join("mod_cache", "validation.json")
+VALIDATION_VERSION = 2
+
+validation_cache = None
+validation_lock = threading.Lock()
+validation_dirty = False
+
+class ArchiveError(Exception):
+    pass
+
+def zip_directory(data):
+    end = data.rfind(b"PK\x05\x06", max(0, len(data) - 65557))
+    if end < 0:
+        raise ArchiveError("no zip end of central directory record")
+    _, _, _, _, count, size, offset, _ = struct.unpack_from("<4s4H2IH", data, end)
+    limit = end
+    if end >= 20 and data[end - 20:end - 16] == b"PK\x06\x07":
+        record = struct.unpack_from("<4sIQI", data, end - 20)[2]
+        if data[record:record + 4] != b"PK\x06\x06":
+            raise ArchiveError("corrupt zip64 end of central directory record")
+        count, size, offset = struct.unpack_from("<3Q", data, record + 32)
+        limit = record
+    if offset + size > limit:
+        raise ArchiveError("central directory out of bounds")
+
+    entries = dict()
+    position = offset
+    for _ in range(count):
+        if data[position:position + 4] != b"PK\x01\x02":
+            raise ArchiveError("corrupt central directory entry")
+        fields = struct.unpack_from("<4s6H3I5H2I", data, position)
+        method, crc, compressed, name_length, extra_length, comment_length, local_offset = (
+            fields[4], fields[7], fields[8], fields[10], fields[11], fields[12], fields[16]
+        )
+        name = data[position + 46:position + 46 + name_length].decode("utf-8", "replace")
+        if 0xFFFFFFFF in (fields[9], compressed, local_offset):
+            compressed, local_offset = zip64_extra(data, position + 46 + name_length, extra_length, fields[9], compressed, local_offset)
+        if local_offset + compressed > offset:
+            raise ArchiveError(f"entry {name} out of bounds")
+        entries[name] = (method, crc, compressed, local_offset)
+        position += 46 + name_length + extra_length + comment_length
+    return entries
+
+def zip64_extra(data, start, length, size, compressed, local_offset):
+    position = start
+    while position + 4 <= start + length:
+        header, field_length = struct.unpack_from("<2H", data, position)
+        if header == 0x0001:
+            values = iter(struct.unpack_from(f"<{field_length // 8}Q", data, position + 4))
+            try:
+                if size == 0xFFFFFFFF:
+                    next(values)
+                if compressed == 0xFFFFFFFF:
+                    compressed = next(values)
+                if local_offset == 0xFFFFFFFF:
+                    local_offset = next(values)
+            except StopIteration:
+                raise ArchiveError("truncated zip64 extra field")
+            return compressed, local_offset
+        position += 4 + field_length
+    raise ArchiveError("missing zip64 extra field")
+
+def zip_read(data, entry):
+    method, crc, compressed, local_offset = entry
+    if data[local_offset:local_offset + 4] != b"PK\x03\x04":
+        raise ArchiveError("corrupt local file header")
+    name_length, extra_length = struct.unpack_from("<2H", data, local_offset + 26)
+    start = local_offset + 30 + name_length + extra_length
+    raw = data[start:start + compressed]
+    if method == 0:
+        content = raw
+    elif method == 8:
+        content = zlib.decompress(raw, -15)
+    else:
+        raise ArchiveError(f"unsupported compression method {method}")
+    if zlib.crc32(content) != crc:
+        raise ArchiveError("CRC mismatch")
+    return content
+
+def read_archive(path):
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            raise ArchiveError("empty file")
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            entries = zip_directory(data)
+            candidates = [name for name in entries if name.endswith("/info.json") and name.count("/") == 1]
+            if not candidates:
+                raise ArchiveError("no info.json in a top-level folder")
+            if len({name.split("/")[0] for name in entries}) > 1:
+                raise ArchiveError("archive has more than one top-level folder")
+            try:
+                info = json.loads(zip_read(data, entries[candidates[0]]).decode("utf-8-sig"))
+            except (ValueError, zlib.error) as e:
+                raise ArchiveError(f"unreadable info.json: {e}")
+    if not isinstance(info, dict):
+        raise ArchiveError("info.json is not an object")
+    return info, len(entries)
+
+def inspect_archive(path, sha1=None):
+    global validation_cache, validation_dirty
+    sha1 = sha1 if sha1 is not None else get_file_hash(path)
+    with validation_lock:
+        if validation_cache is None:
+            validation_cache = dict()
+            if os.path.isfile(VALIDATION_FILE):
+                try:
+                    with open(VALIDATION_FILE) as f:
+                        data = json.load(f)
+                    if data.get("version") == VALIDATION_VERSION:
+                        validation_cache = data["results"]
+                except:
+                    pass
+        if sha1 in validation_cache:
+            return validation_cache[sha1]
+
+    with span("inspect_archive", file=os.path.basename(path)):
+        try:
+            info, entries = read_archive(path)
+            result = {
+                "name": info.get("name"),
+                "version": info.get("version"),
+                "factorio_version": info.get("factorio_version"),
+                "dependencies": info.get("dependencies", []),
+                "entries": entries
+            }
+        except (ArchiveError, OSError, ValueError, struct.error) as e:
+            result = {"error": str(e)}
+
+    with validation_lock:
+        validation_cache[sha1] = result
+        validation_dirty = True
+    return result
+
+def save_validation_cache():
+    global validation_dirty
+    with validation_lock:
+        if validation_cache is None or not validation_dirty:
+            return
+        try:
+            temp = VALIDATION_FILE + ".tmp"
+            with open(temp, "w") as f:
+                json.dump({"version": VALIDATION_VERSION, "results": validation_cache}, f, separators=(",", ":"))
+            os.replace(temp, VALIDATION_FILE)
+            validation_dirty = False
+        except Exception as e:
+            cli.print(f"[red]Could not save validation cache: {e}[/red]")
+
+def validate_archive(path, sha1=None, file_name=None, release=None, name=None):
+    result = inspect_archive(path, sha1)
+    if "error" in result:
+        return [result["error"]], []
+
+    errors = []
+    warnings = []
+    match = MOD_FILE_PATTERN.match(file_name or (release["file_name"] if release is not None else os.path.basename(path)))
+    expected_name = name or (match.group(1) if match else None)
+    expected_version = release["version"] if release is not None else (match.group(2) if match else None)
+    if expected_name is not None and result["name"] != expected_name:
+        errors.append(f"info.json name is {result['name']!r}, expected {expected_name!r}")
+    if expected_version is not None and result["version"] != expected_version:
+        errors.append(f"info.json version is {result['version']!r}, expected {expected_version!r}")
+
+    portal = release.get("info_json") if release is not None else None
+    if portal:
+        if portal.get("factorio_version") and result["factorio_version"] != portal["factorio_version"]:
+            errors.append(f"info.json factorio_version is {result['factorio_version']!r}, portal says {portal['factorio_version']!r}")
+        archive_deps = {parse_dep(code) for code in result["dependencies"]}
+        portal_deps = {parse_dep(code) for code in portal.get("dependencies", [])}
+        for dep in sorted(archive_deps - portal_deps, key=str):
+            warnings.append(f"dependency {dep.kind} {dep} only in info.json")
+        for dep in sorted(portal_deps - archive_deps, key=str):
+            warnings.append(f"dependency {dep.kind} {dep} only on the portal")
+    return errors, warnings
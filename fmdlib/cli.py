@@ -0,0 +1,516 @@
+import argparse
+import atexit
+import os
+import sys
+import time
+import traceback
+
+from . import api, core
+from .api import setup_flask_server, shutdown_flask_server
+from .core import CACHE_POLICIES, cli, title, check_dirs, check_factorio_path, check_factorio_path_set, display_mod_info, format_size, load_userdata, save_userdata, set_factorio_path
+from .daemon import DAEMON_INTERVAL, add_instance, display_instances, remove_instance, run_daemon
+from .download import MIRROR_HEDGE_DELAY, TYPICAL_MOD_SIZE, get_mirror_scheduler
+from .portal import build_data_cache, get_catalog, get_data_cache, get_mod_info, is_error_packet, search
+from .prefetch import display_prefetch, lower_priority, prefetch_mods
+from .store import clear_cache, get_cache_manager
+from .sync import LOCK_FILE, display_outdated, display_validation, download_recursive_mod, find_outdated, flush_caches, import_mod_list, install_locked, install_set, installed_factorio_version, read_mod_list, sync_mods, validate_mods_dir, write_lockfile
+from .trace import display_trace_summary, open_trace
+
+def extract_mod_name_from_url(url):
+    if "mods.factorio.com" in url:
+        parts = url.rstrip("/").split("/")
+        if "mod" in parts:
+            try:
+                idx = parts.index("mod")
+                modname = parts[idx + 1]
+                modname = modname.split("?")[0]
+                return modname
+            except IndexError:
+                pass
+    return None
+
+def ask_mod_name():
+    matches = None
+    while True:
+        cli.print("[bold green]Insert mod name or URL: [/bold green]", end="")
+        name = input().strip()
+        
+        if "http" in name:
+            extracted = extract_mod_name_from_url(name)
+            if extracted:
+                name = extracted
+                cli.print(f"[cyan]Mod name: {name}[/cyan]")
+            else:
+                cli.print("[red]Could not parse URL[/red]")
+                continue
+
+        if matches is not None and name.isdigit():
+            idx = int(name)
+            if 0 <= idx < len(matches):
+                return matches[idx][0]
+
+        packet = get_mod_info(name)
+        if is_error_packet(packet):
+            matches = search(name)
+            longest = 0
+            if matches:
+                longest = max(len(m[0]["name"]) for m in matches)
+            
+            cli.print("\nExact match not found. Did you mean:")
+            for i, (match, confid) in enumerate(matches):
+                padding = " " * (longest - len(match['name']) + 2)
+                cli.print(f"[bold yellow][{i}] {match['name']}{padding}({int(confid * 100)}%)[/bold yellow]")
+            print()
+            
+            if not matches:
+                 cli.print("[red]No similar mods found.[/red]")
+            
+            continue
+        return packet
+
+def help_menu():
+    print("\n")
+    cli.print("[bold yellow]1)[/bold yellow] Install mod")
+    cli.print("[bold yellow]2)[/bold yellow] Download mod")
+    cli.print("[bold yellow]3)[/bold yellow] Import/Update from mod-list.json")
+    cli.print("[bold yellow]4)[/bold yellow] View mod info")
+    cli.print("[bold yellow]5)[/bold yellow] Set Factorio Path")
+    cli.print("[bold yellow]6)[/bold yellow] Clear Cache")
+    cli.print("[bold yellow]7)[/bold yellow] Toggle Browser API Server")
+    cli.print("[bold yellow]0)[/bold yellow] Exit")
+
+def start():
+    opt = 0
+    while True:
+        try:
+            cli.print("\n[bold green]-> [/bold green]", end="")
+            inp = input().strip()
+            if not inp:
+                help_menu()
+                continue
+            opt = int(inp)
+            break
+        except ValueError:
+            help_menu()
+        except KeyboardInterrupt:
+            sys.exit(0)
+
+    if opt == 0:
+        if api.server: shutdown_flask_server()
+        sys.exit(0)
+
+    elif opt in (1, 2):
+        if opt == 1 and not check_factorio_path_set():
+            cli.print("[bold red]Factorio path missing! Use option 5.[/bold red]")
+            return
+
+        try:
+            packet = ask_mod_name()
+            if packet:
+                visited = download_recursive_mod(packet['name'], ver="latest")
+                if opt == 1:
+                    install_set(visited)
+        except KeyboardInterrupt:
+            return
+
+    elif opt == 3:
+        cli.print("\n[bold green]Path to mod-list.json (default: ./mod-list.json): [/bold green]", end="")
+        path = input().strip() or "mod-list.json"
+        import_mod_list(path, install=check_factorio_path_set())
+
+    elif opt == 4:
+        packet = ask_mod_name()
+        if packet:
+            display_mod_info(packet)
+
+    elif opt == 5:
+        set_factorio_path()
+
+    elif opt == 6:
+        clear_cache()
+        cli.print("[green]Cache cleared.[/green]")
+
+    elif opt == 7:
+        if api.server is None:
+            setup_flask_server()
+        else:
+            shutdown_flask_server()
+
+def display_mirror_stats():
+    from rich.table import Table
+    table = Table(title="[bold green]Mirrors[/bold green]")
+    table.add_column("[green]#[/green]")
+    table.add_column("[green]Mirror[/green]")
+    table.add_column("[green]Score[/green]")
+    table.add_column("[green]TTFB[/green]")
+    table.add_column("[green]Throughput[/green]")
+    table.add_column("[green]Error rate[/green]")
+    table.add_column("[green]Attempts[/green]")
+    table.add_column("[green]Last used[/green]")
+
+    for i, (mirror, score, estimate, stats) in enumerate(get_mirror_scheduler().report()):
+        last_used = time.strftime("%Y-%m-%d %H:%M", time.localtime(stats["updated_at"])) if "updated_at" in stats else "never"
+        table.add_row(
+            str(i + 1),
+            mirror,
+            f"{score:.2f}s",
+            f"{estimate['ttfb'] * 1000:.0f} ms",
+            f"{estimate['throughput'] / (1024 * 1024):.2f} MB/s",
+            f"{estimate['error_rate'] * 100:.0f}%",
+            f"{stats.get('samples', 0)} ({stats.get('errors', 0)} failed)",
+            last_used
+        )
+    cli.print(table)
+    cli.print(f"[bright_black]Score is the expected time for a {TYPICAL_MOD_SIZE // (1024 * 1024)} MB download divided by the success rate; lower is tried first.[/bright_black]")
+    if MIRROR_HEDGE_DELAY:
+        cli.print(f"[bright_black]The second mirror is raced when the first has not responded after {MIRROR_HEDGE_DELAY:g}s.[/bright_black]")
+
+def display_cache_stats():
+    stats = get_cache_manager().stats()
+    from rich.table import Table
+    table = Table(title="[bold green]Mod cache[/bold green]", show_header=False)
+    table.add_column()
+    table.add_column()
+    table.add_row("[green]Archives[/green]", f"{stats['files']} ({stats['pinned']} pinned by installed mods)")
+    table.add_row("[green]Size[/green]", f"{format_size(stats['size'])} of {format_size(stats['budget'])} budget")
+    table.add_row("[green]Partial downloads[/green]", format_size(stats["partial_size"]))
+    table.add_row("[green]Eviction policy[/green]", stats["policy"].upper())
+    table.add_row("[green]Hit rate[/green]", f"{stats['hit_rate'] * 100:.1f}% ({stats['hits']} hits, {stats['misses']} misses)")
+    table.add_row("[green]Evictions[/green]", f"{stats['evictions']} ({format_size(stats['evicted_bytes'])})")
+    cli.print(table)
+
+def resolve_mod_name(name_input):
+    if "http" in name_input:
+        extracted = extract_mod_name_from_url(name_input)
+        if extracted:
+            cli.print(f"[cyan]Mod name: {extracted}[/cyan]")
+            return extracted
+        else:
+            cli.print(f"[red]Could not parse mod URL: {name_input}[/red]")
+            sys.exit(1)
+    return name_input
+
+def main():
+    atexit.register(flush_caches)
+    try:
+        load_userdata()
+
+        parser = argparse.ArgumentParser(description="Factorio Mod Manager")
+        parser.add_argument("--trace", metavar="FILE", help="Append timing spans as JSON lines to FILE and print a summary on exit")
+        subparsers = parser.add_subparsers(dest="command", help="Available commands")
+
+        p_install = subparsers.add_parser("install", help="Download and install a mod including dependencies")
+        p_install.add_argument("modname", nargs="?", help="Name or URL of the mod")
+        p_install.add_argument("--locked", action="store_true", help="Install exactly the mods listed in the lockfile")
+        p_install.add_argument("--lockfile", default=LOCK_FILE, help=f"Lockfile to use with --locked (default: {LOCK_FILE})")
+
+        p_download = subparsers.add_parser("download", help="Download a mod to the cache folder")
+        p_download.add_argument("modname", nargs="?", help="Name or URL of the mod")
+        p_download.add_argument("--locked", action="store_true", help="Download exactly the mods listed in the lockfile")
+        p_download.add_argument("--lockfile", default=LOCK_FILE, help=f"Lockfile to use with --locked (default: {LOCK_FILE})")
+
+        p_lock = subparsers.add_parser("lock", help="Resolve mods and write exact versions to a lockfile")
+        p_lock.add_argument("modnames", nargs="*", help="Mods to lock (default: enabled mods in mod-list.json)")
+        p_lock.add_argument("--mod-list", help="mod-list.json to read the mods from (default: the one in the game folder)")
+        p_lock.add_argument("--output", default=LOCK_FILE, help=f"Lockfile to write (default: {LOCK_FILE})")
+
+        p_info = subparsers.add_parser("info", help="Show details about a mod")
+        p_info.add_argument("modname", help="Name or URL of the mod")
+
+        p_import = subparsers.add_parser("import", aliases=["sync"], help="Download and install every enabled mod from a mod-list.json")
+        p_import.add_argument("path", nargs="?", default="mod-list.json", help="Path to mod-list.json (default: ./mod-list.json)")
+        p_import.add_argument("--download-only", action="store_true", help="Only fill the cache, do not touch the mods folder")
+
+        subparsers.add_parser("outdated", help="List installed mods that have newer releases")
+
+        p_upgrade = subparsers.add_parser("upgrade", help="Upgrade outdated installed mods")
+        p_upgrade.add_argument("modnames", nargs="*", help="Mods to upgrade (default: every outdated mod)")
+        p_upgrade.add_argument("--dry-run", action="store_true", help="Only show what would be upgraded")
+
+        p_validate = subparsers.add_parser("validate", help="Check mod archives without extracting them")
+        p_validate.add_argument("path", nargs="?", help="Folder of mod archives (default: the game's mods folder)")
+        p_validate.add_argument("--portal", action="store_true", help="Also compare factorio_version and dependencies with the Mod Portal")
+
+        p_prefetch = subparsers.add_parser("prefetch", help="Warm the cache with popular and watched mods")
+        p_prefetch.add_argument("--top", type=int, help="Number of most downloaded mods to keep cached (default: prefetch_top)")
+        p_prefetch.add_argument("--bandwidth", type=int, help="Download cap in bytes/s (default: prefetch_bandwidth, 0 = unlimited)")
+        p_prefetch.add_argument("--ignore-quiet-hours", action="store_true", help="Run even inside prefetch_quiet_hours")
+        p_prefetch.add_argument("--dry-run", action="store_true", help="Only show what would be prefetched")
+
+        p_watch = subparsers.add_parser("watch", help="Manage the mods that are always prefetched")
+        watch_commands = p_watch.add_subparsers(dest="watch_command")
+        p_watch_add = watch_commands.add_parser("add", help="Add mods to the watchlist")
+        p_watch_add.add_argument("modnames", nargs="+")
+        p_watch_remove = watch_commands.add_parser("remove", help="Remove mods from the watchlist")
+        p_watch_remove.add_argument("modnames", nargs="+")
+        watch_commands.add_parser("list", help="Show the watchlist")
+
+        p_path = subparsers.add_parser("set-path", help="Set the Factorio installation directory")
+        p_path.add_argument("path", help="Path to Factorio folder (containing 'mods' or 'data')")
+
+        subparsers.add_parser("start-server", help="Start the browser API server")
+
+        p_daemon = subparsers.add_parser("daemon", help="Run the API server and keep every registered instance in sync")
+        p_daemon.add_argument("--interval", type=float, default=DAEMON_INTERVAL, help=f"Seconds between mods folder checks (default: {DAEMON_INTERVAL})")
+
+        p_instance = subparsers.add_parser("instance", help="Manage the Factorio instances kept in sync by the daemon")
+        instance_commands = p_instance.add_subparsers(dest="instance_command", required=True)
+        p_instance_add = instance_commands.add_parser("add", help="Register or update an instance")
+        p_instance_add.add_argument("name", help="Instance name")
+        p_instance_add.add_argument("path", help="Path to the Factorio folder of the instance")
+        target = p_instance_add.add_mutually_exclusive_group()
+        target.add_argument("--mods", nargs="+", help="Mods to keep installed (with dependencies)")
+        target.add_argument("--mod-list", help="mod-list.json to follow (default: the instance's own)")
+        target.add_argument("--lockfile", help="Lockfile to install exactly")
+        p_instance_remove = instance_commands.add_parser("remove", help="Unregister an instance")
+        p_instance_remove.add_argument("name", help="Instance name")
+        instance_commands.add_parser("list", help="List registered instances")
+
+        subparsers.add_parser("update-catalog", help="Refresh the local Mod Portal catalog snapshot")
+
+        subparsers.add_parser("mirrors", help="Show mirror statistics and the order they are tried in")
+
+        p_cache = subparsers.add_parser("cache", help="Inspect or trim the mod cache")
+        cache_commands = p_cache.add_subparsers(dest="cache_command", required=True)
+        cache_commands.add_parser("stats", help="Show cache size, hit rate and evictions")
+        p_gc = cache_commands.add_parser("gc", help="Evict unpinned archives until the cache fits its budget")
+        p_gc.add_argument("--budget", type=int, help="Byte budget to enforce instead of cache_budget")
+        p_gc.add_argument("--policy", choices=CACHE_POLICIES, help="Eviction policy to use instead of cache_policy")
+        cache_commands.add_parser("clear", help="Delete the whole cache")
+
+        subparsers.add_parser("help", help="List all usable commands")
+
+        args = parser.parse_args()
+        if args.command not in ("help", "set-path"):
+            check_dirs()
+        if args.trace:
+            open_trace(args.trace)
+            atexit.register(display_trace_summary)
+
+        if args.command is None:
+            print(title)
+            print("Fetching Mod Portal database...")
+            build_data_cache()
+            help_menu()
+            while True:
+                start()
+
+        elif args.command == "help":
+            parser.print_help()
+            sys.exit(0)
+
+        elif args.command == "set-path":
+            path = args.path.strip()
+            if os.path.isdir(path) and check_factorio_path(path):
+                core.factorio_path = path
+                save_userdata()
+                cli.print(f"[bold green]Success: Factorio path set to {path}[/bold green]")
+            else:
+                cli.print(f"[bold red]Error: Invalid path. Ensure the folder exists and contains 'mods' or 'data'.[/bold red]")
+            sys.exit(0)
+
+        elif args.command == "cache":
+            if args.cache_command == "stats":
+                display_cache_stats()
+            elif args.cache_command == "gc":
+                evicted = get_cache_manager().gc(budget=args.budget, policy=args.policy)
+                for path, size in evicted:
+                    cli.print(f"[yellow]Evicted {path} ({format_size(size)})[/yellow]")
+                cli.print(f"[bold green]Freed {format_size(sum(size for _, size in evicted))} in {len(evicted)} files[/bold green]")
+            else:
+                clear_cache()
+                cli.print("[green]Cache cleared.[/green]")
+            sys.exit(0)
+
+        elif args.command == "mirrors":
+            display_mirror_stats()
+            sys.exit(0)
+
+        elif args.command == "update-catalog":
+            print("Fetching Mod Portal database...")
+            started = time.time()
+            build_data_cache(force_rebuild=True)
+            if get_data_cache().get("checked_at", 0) < started:
+                sys.exit(1)
+            cli.print(f"[bold green]Catalog updated: {len(get_catalog())} mods[/bold green]")
+            sys.exit(0)
+
+        elif args.command == "start-server":
+            print("Fetching Mod Portal database...")
+            build_data_cache()
+            setup_flask_server()
+            cli.print("[yellow]Press Ctrl+C to stop the server.[/yellow]")
+            try:
+                while True:
+                    time.sleep(1)
+            except KeyboardInterrupt:
+                shutdown_flask_server()
+            sys.exit(0)
+
+        elif args.command == "daemon":
+            try:
+                build_data_cache()
+                setup_flask_server()
+                run_daemon(args.interval)
+            except KeyboardInterrupt:
+                shutdown_flask_server()
+            sys.exit(0)
+
+        elif args.command == "instance":
+            if args.instance_command == "add":
+                try:
+                    add_instance(args.name, args.path, mods=args.mods, mod_list=args.mod_list, lockfile=args.lockfile)
+                except ValueError as e:
+                    cli.print(f"[bold red]Error: {e}[/bold red]")
+                    sys.exit(1)
+                cli.print(f"[bold green]Instance {args.name} registered.[/bold green]")
+            elif args.instance_command == "remove":
+                if remove_instance(args.name) is None:
+                    cli.print(f"[bold red]Unknown instance {args.name}[/bold red]")
+                    sys.exit(1)
+                cli.print(f"[bold green]Instance {args.name} removed.[/bold green]")
+            else:
+                display_instances()
+            sys.exit(0)
+
+        elif args.command == "info":
+            print("Fetching Mod Portal database...")
+            build_data_cache()
+            mod_name = resolve_mod_name(args.modname)
+            packet = get_mod_info(mod_name)
+            
+            if is_error_packet(packet):
+                cli.print(f"[red]Error finding mod '{mod_name}': {packet.get('message')}[/red]")
+            else:
+                display_mod_info(packet)
+            sys.exit(0)
+
+        elif args.command in ["outdated", "upgrade"]:
+            if not check_factorio_path_set():
+                cli.print("[bold red]Factorio path not set.[/bold red]")
+                sys.exit(1)
+            build_data_cache(revalidate=True)
+            mods_dir = os.path.join(core.factorio_path, "mods")
+            outdated, installed = find_outdated(mods_dir)
+            game_version = installed_factorio_version(installed)
+            if args.command == "upgrade" and args.modnames:
+                outdated = [(mod, latest) for mod, latest in outdated if mod["name"] in args.modnames]
+
+            if not outdated:
+                cli.print(f"[bold green]All {len(installed)} installed mods are up to date.[/bold green]")
+                sys.exit(0)
+            display_outdated(outdated, game_version)
+
+            if args.command == "upgrade" and not args.dry_run:
+                summary = sync_mods([mod["name"] for mod, _ in outdated], mods_dir=mods_dir, factorio_version=game_version)
+                sys.exit(0 if summary is not None and not summary["failed"] else 1)
+            sys.exit(0)
+
+        elif args.command == "prefetch":
+            build_data_cache(revalidate=True)
+            top = args.top if args.top is not None else core.prefetch_top
+            if not top and not core.prefetch_watchlist:
+                cli.print("[yellow]Nothing to prefetch: pass --top or add mods with 'watch add'.[/yellow]")
+                sys.exit(0)
+            lower_priority(whole_process=True)
+            try:
+                summary = prefetch_mods(
+                    top, core.prefetch_watchlist,
+                    bandwidth=args.bandwidth if args.bandwidth is not None else core.prefetch_bandwidth,
+                    quiet_hours="" if args.ignore_quiet_hours else core.prefetch_quiet_hours,
+                    dry_run=args.dry_run
+                )
+            except ValueError as e:
+                cli.print(f"[bold red]Error: {e}[/bold red]")
+                sys.exit(1)
+            display_prefetch(summary, dry_run=args.dry_run)
+            sys.exit(1 if summary["failed"] else 0)
+
+        elif args.command == "watch":
+            if args.watch_command == "add":
+                core.prefetch_watchlist.extend(name for name in args.modnames if name not in core.prefetch_watchlist)
+                save_userdata()
+            elif args.watch_command == "remove":
+                core.prefetch_watchlist[:] = [name for name in core.prefetch_watchlist if name not in args.modnames]
+                save_userdata()
+            cli.print(f"[bold green]Watchlist:[/bold green] {', '.join(core.prefetch_watchlist) or 'empty'}")
+            sys.exit(0)
+
+        elif args.command == "validate":
+            if args.path is None and not check_factorio_path_set():
+                cli.print("[bold red]Factorio path not set.[/bold red]")
+                sys.exit(1)
+            if args.portal:
+                build_data_cache()
+            results = validate_mods_dir(args.path or os.path.join(core.factorio_path, "mods"), portal=args.portal)
+            display_validation(results)
+            sys.exit(1 if any(errors for _, errors, _ in results) else 0)
+
+        elif args.command in ["import", "sync"]:
+            install = not args.download_only
+            if install and not check_factorio_path_set():
+                cli.print("[bold red]Cannot install: Factorio path not set.[/bold red]")
+                sys.exit(1)
+            summary = import_mod_list(args.path, install=install)
+            sys.exit(0 if summary is not None and not summary["failed"] else 1)
+
+        elif args.command == "lock":
+            mod_names = args.modnames
+            if not mod_names:
+                mod_list = args.mod_list
+                if mod_list is None and check_factorio_path_set():
+                    mod_list = os.path.join(core.factorio_path, "mods", "mod-list.json")
+                if mod_list is None or not os.path.isfile(mod_list):
+                    cli.print("[bold red]No mods given and no mod-list.json found.[/bold red]")
+                    sys.exit(1)
+                mod_names = read_mod_list(mod_list)
+            build_data_cache()
+            sys.exit(0 if write_lockfile(mod_names, args.output) is not None else 1)
+
+        elif args.command in ["install", "download"] and args.locked:
+            install = args.command == "install"
+            if install and not check_factorio_path_set():
+                cli.print("[bold red]Cannot install: Factorio path not set.[/bold red]")
+                sys.exit(1)
+            summary = install_locked(args.lockfile, install=install)
+            sys.exit(0 if summary is not None and not summary["failed"] else 1)
+
+        elif args.command in ["install", "download"]:
+            if not args.modname:
+                parser.error(f"{args.command} needs a mod name unless --locked is given")
+            print("Fetching Mod Portal database...")
+            build_data_cache()
+            
+            mod_name = resolve_mod_name(args.modname)
+            packet = get_mod_info(mod_name)
+
+            if is_error_packet(packet):
+                cli.print(f"[red]Mod not found: {mod_name}[/red]")
+                matches = search(mod_name)
+                if matches:
+                    cli.print("Did you mean:")
+                    for m, c in matches:
+                        cli.print(f" - {m['name']} ({int(c*100)}%)")
+                sys.exit(1)
+
+            visited = download_recursive_mod(packet['name'], ver="latest")
+            
+            if args.command == "install":
+                if check_factorio_path_set():
+                    install_set(visited)
+                else:
+                    cli.print("[bold red]Cannot install: Factorio path not set.[/bold red]")
+                    cli.print("Use 'python manager.py set-path <path>' or run without arguments to set it.")
+            else:
+                cli.print("[bold green]Downloads complete.[/bold green]")
+            
+            sys.exit(0)
+
+    except KeyboardInterrupt:
+        if api.server: shutdown_flask_server()
+        sys.exit(0)
+    except Exception as exc:
+        cli.print(f"\n[bold red]Critical Error:[/bold red] {exc}")
+        traceback.print_exc()
+        if api.server: shutdown_flask_server()
+        sys.exit(1)
@@ -0,0 +1,224 @@
+import json
+import os
+import platform
+import re
+import threading
+from pathlib import Path
+
+IGNORED_MODS = {
+    "base",
+    "space-age",
+    "quality",
+    "elevated-rails"
+}
+
+MAX_RELEASES_DISPLAYED = 6
+MAX_WORDS_PER_LINE = 7
+
+CATALOG_TTL = 6 * 60 * 60
+METADATA_TTL = 30 * 60
+INSTALL_METHODS = ("auto", "hardlink", "reflink", "symlink", "copy")
+INSTANCES_FILE = "instances.json"
+PREFETCH_INTERVAL = 60 * 60
+CACHE_BUDGET = 10 * 1024 * 1024 * 1024
+CACHE_POLICIES = ("lru", "lfu")
+
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+MOD_FILE_PATTERN = re.compile(r"^(.+)_(\d+\.\d+\.\d+)\.zip$")
+
+class LazyConsole:
+    def __init__(self):
+        self.console = None
+
+    def __getattr__(self, name):
+        if self.console is None:
+            from rich.console import Console
+            self.console = Console()
+        return getattr(self.console, name)
+
+cli = LazyConsole()
+
+title = r"""
+  _____          _             _         __  __           _   ____            _        _
+ |  ___|_ _  ___| |_ ___  _ __(_) ___   |  \/  | ___   __| | |  _ \ ___  _ __| |_ __ _| |
+ | |_ / _` |/ __| __/ _ \| '__| |/ _ \  | |\/| |/ _ \ / _` | | |_) / _ \| '__| __/ _` | |
+ |  _| (_| | (__| || (_) | |  | | (_) | | |  | | (_) | (_| | |  __/ (_) | |  | || (_| | |
+ |_|  \__,_|\___|\__\___/|_|  |_|\___/  |_|  |_|\___/ \__,_| |_|   \___/|_|   \__\__,_|_|
+"""
+
+factorio_path = ""
+catalog_ttl = CATALOG_TTL
+metadata_ttl = METADATA_TTL
+host_concurrency = dict()
+install_method = "auto"
+cache_budget = CACHE_BUDGET
+cache_policy = "lru"
+prefetch_top = 0
+prefetch_watchlist = []
+prefetch_bandwidth = 0
+prefetch_quiet_hours = ""
+prefetch_interval = PREFETCH_INTERVAL
+instances = None
+instances_lock = threading.Lock()
+state_lock = threading.Lock()
+
+def save_userdata():
+    global factorio_path
+    data = {
+        "path": factorio_path,
+        "catalog_ttl": catalog_ttl,
+        "metadata_ttl": metadata_ttl,
+        "host_concurrency": host_concurrency,
+        "install_method": install_method,
+        "cache_budget": cache_budget,
+        "cache_policy": cache_policy,
+        "prefetch_top": prefetch_top,
+        "prefetch_watchlist": prefetch_watchlist,
+        "prefetch_bandwidth": prefetch_bandwidth,
+        "prefetch_quiet_hours": prefetch_quiet_hours,
+        "prefetch_interval": prefetch_interval
+    }
+    with open("userdata.json", "w") as file:
+        file.write(json.dumps(data, indent=4))
+
+def check_factorio_path(path):
+    return os.path.isdir(path) and ("mods" in os.listdir(path) or "data" in os.listdir(path))
+
+def check_factorio_path_set():
+    global factorio_path
+    return factorio_path != "" and os.path.isdir(factorio_path)
+
+def check_credentials_set():
+    return True
+
+def load_userdata():
+    global factorio_path, catalog_ttl, metadata_ttl, host_concurrency, install_method, cache_budget, cache_policy
+    global prefetch_top, prefetch_watchlist, prefetch_bandwidth, prefetch_quiet_hours, prefetch_interval
+    if os.path.isfile("userdata.json"):
+        try:
+            with open("userdata.json") as file:
+                data = json.loads(file.read())
+            factorio_path = data.get("path", "")
+            catalog_ttl = data.get("catalog_ttl", CATALOG_TTL)
+            metadata_ttl = data.get("metadata_ttl", METADATA_TTL)
+            host_concurrency = data.get("host_concurrency", dict())
+            install_method = data.get("install_method", "auto")
+            if install_method not in INSTALL_METHODS:
+                cli.print(f"[red]Unknown install_method '{install_method}', using auto[/red]")
+                install_method = "auto"
+            cache_budget = data.get("cache_budget", CACHE_BUDGET)
+            cache_policy = data.get("cache_policy", "lru")
+            if cache_policy not in CACHE_POLICIES:
+                cli.print(f"[red]Unknown cache_policy '{cache_policy}', using lru[/red]")
+                cache_policy = "lru"
+            prefetch_top = data.get("prefetch_top", 0)
+            prefetch_watchlist = data.get("prefetch_watchlist", [])
+            prefetch_bandwidth = data.get("prefetch_bandwidth", 0)
+            prefetch_quiet_hours = data.get("prefetch_quiet_hours", "")
+            prefetch_interval = data.get("prefetch_interval", PREFETCH_INTERVAL)
+        except:
+            cli.print("[red]Error loading userdata.json[/red]")
+
+    if not check_factorio_path_set():
+        auto_path = "."
+        if platform.system() == 'Darwin':
+            auto_path = os.path.join(Path.home(), "Library/Application Support/factorio")
+        elif platform.system() == "Linux":
+            auto_path = os.path.join(Path.home(), ".factorio")
+        elif platform.system() == 'Windows':
+            auto_path = os.path.join(Path.home(), "AppData/Roaming/Factorio")
+        if check_factorio_path(auto_path):
+            factorio_path = auto_path
+
+def set_factorio_path():
+    global factorio_path
+    path = ""
+    while True:
+        cli.print("[bold green]Insert Factorio path: [/bold green]", end="")
+        path = input().strip()
+        if not os.path.isdir(path):
+            cli.print("[red]Path does not exist.[/red]")
+            continue
+        if not check_factorio_path(path):
+            cli.print("[bold red]!!! Invalid Factorio path (could not find 'mods' or 'data' folders) !!![/bold red]")
+            continue
+        break
+    factorio_path = path
+    save_userdata()
+    cli.print("[bold green]Path changed![/bold green]")
+
+def split_word_lines(text, words_per_line=MAX_WORDS_PER_LINE):
+    words = text.split(" ")
+    splitted = list()
+    c = 0
+    temp = list()
+    for word in words:
+        if c == words_per_line:
+            splitted.append(" ".join(temp))
+            temp = list()
+            c = 0
+        temp.append(word)
+        c+=1
+    splitted.append(" ".join(temp))
+    return splitted
+
+def display_mod_info(packet, max_releases=MAX_RELEASES_DISPLAYED):
+    cli.print(f"[bold green]Name:[/bold green] [bold white]{packet.get('title', packet.get('name'))}[/bold white]")
+    cli.print(f"[bold green]Owner:[/bold green] [bold white]{packet.get('owner', 'Unknown')}[/bold white]")
+    cli.print(f"[bold green]Downloads:[/bold green] [bold white]{str(packet.get('downloads_count', 0))}[/bold white]")
+    cli.print(f"[bold green]ID:[/bold green] [bold white]{packet['name']}[/bold white]")
+    cli.print(f"\nDescription: ")
+    cli.print(f"\n".join(split_word_lines(packet.get('summary', ''))))
+    print()
+
+    releases = list(reversed(packet.get("releases", [])))
+    if max_releases == -1:
+        max_releases = len(releases)
+
+    from rich.table import Table
+    releases_table = Table(title="[bold green]Releases[/bold green]")
+    releases_table.add_column("[green]File name[green]")
+    releases_table.add_column("[green]Mod Version[green]")
+    releases_table.add_column("[green]Game Version[green]")
+
+    i = 0
+    for x in releases:
+        if i == max_releases:
+            releases_table.add_row("", "", "")
+            releases_table.add_row(f"[bold red]{str(len(releases) - i)} more...[/bold red]", "", "")
+            break
+        
+        info = x.get("info_json", {})
+        game_ver = info.get("factorio_version", "Unknown")
+        releases_table.add_row(x["file_name"], x["version"], game_ver)
+        i+=1
+    cli.print(releases_table)
+
+def check_dirs():
+    os.makedirs("mod_cache", exist_ok=True)
+
+def format_size(size):
+    for unit in ("B", "KB", "MB", "GB"):
+        if size < 1024 or unit == "GB":
+            return f"{size:.1f} {unit}" if unit != "B" else f"{size} B"
+        size /= 1024
+
+def get_instances():
+    global instances
+    with instances_lock:
+        if instances is None:
+            instances = dict()
+            if os.path.isfile(INSTANCES_FILE):
+                try:
+                    with open(INSTANCES_FILE) as f:
+                        instances = json.load(f)
+                except Exception as e:
+                    cli.print(f"[red]Could not read {INSTANCES_FILE}: {e}[/red]")
+        return instances
+
+def save_instances():
+    with instances_lock:
+        temp = INSTANCES_FILE + ".tmp"
+        with open(temp, "w") as f:
+            json.dump(instances or dict(), f, indent=4)
+        os.replace(temp, INSTANCES_FILE)
@@ -0,0 +1,143 @@
+import os
+import threading
+import time
+
+from . import core
+from .core import cli, check_factorio_path, get_instances, save_instances
+from .portal import build_data_cache, fetch_catalog, get_data_cache, publish_catalog
+from .sync import install_locked, read_mod_list, sync_mods
+from .trace import span
+
+DAEMON_INTERVAL = 30
+
+instance_status = dict()
+daemon_running = False
+daemon_wakeup = threading.Event()
+daemon_requests = set()
+
+def add_instance(name, path, mods=None, mod_list=None, lockfile=None):
+    if not check_factorio_path(path):
+        raise ValueError(f"{path} does not look like a Factorio folder (no 'mods' or 'data')")
+    instance = {"path": os.path.abspath(path)}
+    if mods:
+        instance["mods"] = list(mods)
+    if mod_list:
+        instance["mod_list"] = os.path.abspath(mod_list)
+    if lockfile:
+        instance["lockfile"] = os.path.abspath(lockfile)
+    get_instances()[name] = instance
+    save_instances()
+    return instance
+
+def remove_instance(name):
+    removed = get_instances().pop(name, None)
+    if removed is not None:
+        save_instances()
+        instance_status.pop(name, None)
+    return removed
+
+def instance_target_file(instance):
+    if instance.get("lockfile"):
+        return instance["lockfile"]
+    if instance.get("mods"):
+        return None
+    return instance.get("mod_list") or os.path.join(instance["path"], "mods", "mod-list.json")
+
+def instance_signature(instance):
+    entries = []
+    mods_dir = os.path.join(instance["path"], "mods")
+    if os.path.isdir(mods_dir):
+        for entry in os.scandir(mods_dir):
+            if entry.name.endswith(".tmp") or entry.name == "mod-list.json":
+                continue
+            try:
+                st = entry.stat(follow_symlinks=False)
+            except OSError:
+                continue
+            entries.append((entry.name, st.st_size, st.st_mtime_ns))
+    target = instance_target_file(instance)
+    if target is not None and os.path.isfile(target):
+        st = os.stat(target)
+        entries.append((target, st.st_size, st.st_mtime_ns))
+    return tuple(sorted(entries))
+
+def converge_instance(name, instance):
+    mods_dir = os.path.join(instance["path"], "mods")
+    status = instance_status.setdefault(name, dict())
+    status.update(state="syncing", started_at=time.time())
+    cli.print(f"[cyan]Converging instance {name} ({mods_dir})...[/cyan]")
+    summary = None
+    try:
+        with span("converge_instance", instance=name):
+            if instance.get("lockfile"):
+                summary = install_locked(instance["lockfile"], mods_dir=mods_dir)
+            else:
+                target = instance_target_file(instance)
+                mod_names = instance.get("mods") or (read_mod_list(target) if target and os.path.isfile(target) else [])
+                summary = sync_mods(mod_names, mods_dir=mods_dir) if mod_names else None
+        status.update(state="idle" if summary is not None else "failed", message=None if summary is not None else "Nothing to sync or resolution failed")
+    except Exception as e:
+        status.update(state="failed", message=str(e))
+        cli.print(f"[red]Failed to converge instance {name}: {e}[/red]")
+    status.update(finished_at=time.time(), summary=summary)
+    return summary
+
+def request_instance_sync(name):
+    daemon_requests.add(name)
+    daemon_wakeup.set()
+
+def run_daemon(interval=DAEMON_INTERVAL):
+    global daemon_running
+    build_data_cache()
+    daemon_running = True
+    signatures = dict()
+    catalog_stamp = get_data_cache().get("updated_at")
+    next_refresh = time.time() + core.catalog_ttl
+    cli.print(f"[yellow]Daemon watching {len(get_instances())} instances every {interval}s. Press Ctrl+C to stop.[/yellow]")
+    try:
+        while True:
+            if time.time() >= next_refresh:
+                try:
+                    refreshed = fetch_catalog(get_data_cache())
+                    publish_catalog(refreshed)
+                except Exception as e:
+                    refreshed = None
+                    cli.print(f"[red]Catalog refresh failed, keeping the current snapshot and retrying in {interval}s: {e}[/red]")
+                if refreshed is not None and get_data_cache().get("updated_at") != catalog_stamp:
+                    catalog_stamp = get_data_cache().get("updated_at")
+                    for name, instance in get_instances().items():
+                        if not instance.get("lockfile"):
+                            signatures.pop(name, None)
+                next_refresh = time.time() + (core.catalog_ttl if refreshed is not None else interval)
+
+            requested = set(daemon_requests)
+            daemon_requests.difference_update(requested)
+            current = get_instances()
+            for name in [name for name in signatures if name not in current]:
+                del signatures[name]
+            for name, instance in list(current.items()):
+                signature = instance_signature(instance)
+                if name in requested or signatures.get(name) != signature:
+                    converge_instance(name, instance)
+                    signatures[name] = instance_signature(instance)
+
+            daemon_wakeup.wait(timeout=interval)
+            daemon_wakeup.clear()
+    finally:
+        daemon_running = False
+
+def display_instances():
+    from rich.table import Table
+    table = Table(title="[bold green]Instances[/bold green]")
+    table.add_column("[green]Name[/green]")
+    table.add_column("[green]Path[/green]")
+    table.add_column("[green]Target[/green]")
+    for name, instance in sorted(get_instances().items()):
+        if instance.get("lockfile"):
+            target = f"lockfile {instance['lockfile']}"
+        elif instance.get("mods"):
+            target = ", ".join(instance["mods"])
+        else:
+            target = f"mod-list {instance_target_file(instance)}"
+        table.add_row(name, instance["path"], target)
+    cli.print(table)
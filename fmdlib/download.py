@@ -0,0 +1,438 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, Future
+
+from .archive import validate_archive
+from .core import DOWNLOAD_CHUNK_SIZE, cli, state_lock
+from .net import http_request
+from .store import inflight_downloads, inflight_lock, get_cache_checksums, get_cache_manager, get_file_hash, hash_file, register_stored_file, store_path
+from .trace import span, trace_tag
+
+SEGMENT_THRESHOLD = 64 * 1024 * 1024
+SEGMENT_COUNT = 4
+
+FALLBACK_MIRRORS = [
+    "https://official-factorio-mirror.re146.dev",
+    "https://mods-storage.re146.dev"
+]
+if os.environ.get("FMD_MIRRORS"):
+    FALLBACK_MIRRORS = os.environ["FMD_MIRRORS"].split(",")
+
+MIRROR_STATS_FILE = "mirror_stats.json"
+MIRROR_SMOOTHING = 0.3
+MIRROR_HALF_LIFE = 7 * 24 * 60 * 60
+MIRROR_HEDGE_DELAY = 3.0
+MIRROR_LOSS_PENALTY = 0.5
+MIRROR_PRIOR = {"ttfb": 0.5, "throughput": 2 * 1024 * 1024, "error_rate": 0.0}
+TYPICAL_MOD_SIZE = 4 * 1024 * 1024
+
+mirror_scheduler = None
+
+class TransferCancelled(Exception):
+    pass
+
+class MirrorScheduler:
+    def __init__(self, mirrors, path=MIRROR_STATS_FILE):
+        self.mirrors = list(mirrors)
+        self.path = path
+        self.stats = None
+        self.dirty = False
+        self.lock = threading.Lock()
+
+    def load(self):
+        if self.stats is not None:
+            return
+        self.stats = dict()
+        if os.path.isfile(self.path):
+            try:
+                with open(self.path) as f:
+                    self.stats = json.load(f)
+            except:
+                pass
+
+    def save(self):
+        with self.lock:
+            if not self.dirty:
+                return
+            temp = self.path + ".tmp"
+            with open(temp, "w") as f:
+                json.dump(self.stats, f, indent=4)
+            os.replace(temp, self.path)
+            self.dirty = False
+
+    def estimate(self, mirror):
+        stats = self.stats.get(mirror)
+        if stats is None:
+            return dict(MIRROR_PRIOR)
+        weight = 0.5 ** (max(0, time.time() - stats["updated_at"]) / MIRROR_HALF_LIFE)
+        return {key: weight * stats[key] + (1 - weight) * prior for key, prior in MIRROR_PRIOR.items()}
+
+    def score(self, mirror):
+        estimate = self.estimate(mirror)
+        expected = estimate["ttfb"] + TYPICAL_MOD_SIZE / max(estimate["throughput"], 1)
+        return expected / max(0.05, 1 - estimate["error_rate"])
+
+    def ranked(self):
+        with self.lock:
+            self.load()
+            return sorted(self.mirrors, key=lambda mirror: (self.score(mirror), self.mirrors.index(mirror)))
+
+    def record(self, mirror, error, ttfb=None, size=0, duration=0):
+        with self.lock:
+            self.load()
+            stats = self.stats.get(mirror)
+            if stats is None:
+                stats = dict(MIRROR_PRIOR, samples=0, errors=0, bytes=0)
+                self.stats[mirror] = stats
+            else:
+                stats.update(self.estimate(mirror))
+
+            if error is not None:
+                stats["error_rate"] += MIRROR_SMOOTHING * (float(error) - stats["error_rate"])
+            if ttfb is not None:
+                stats["ttfb"] += MIRROR_SMOOTHING * (ttfb - stats["ttfb"])
+            if size >= 64 * 1024 and duration > 0:
+                stats["throughput"] += MIRROR_SMOOTHING * (size / duration - stats["throughput"])
+            stats["samples"] += 1
+            stats["errors"] += 1 if error is True else 0
+            stats["bytes"] += size
+            stats["updated_at"] = time.time()
+            self.dirty = True
+
+    def report(self):
+        with self.lock:
+            self.load()
+            rows = []
+            for mirror in sorted(self.mirrors, key=lambda mirror: (self.score(mirror), self.mirrors.index(mirror))):
+                stats = self.stats.get(mirror, dict())
+                rows.append((mirror, self.score(mirror), self.estimate(mirror), stats))
+            return rows
+
+def get_mirror_scheduler():
+    global mirror_scheduler
+    with state_lock:
+        if mirror_scheduler is None:
+            mirror_scheduler = MirrorScheduler(FALLBACK_MIRRORS)
+        return mirror_scheduler
+
+def save_mirror_stats():
+    if mirror_scheduler is not None:
+        try:
+            mirror_scheduler.save()
+        except Exception as e:
+            cli.print(f"[red]Could not save mirror statistics: {e}[/red]")
+
+def mirror_url(mirror, name, ver):
+    return f"{mirror.rstrip('/')}/{name}/{ver}.zip"
+
+def build_download_urls(packet, release):
+    ranked = get_mirror_scheduler().ranked()
+    if not release.get("urls"):
+        return [(mirror_url(mirror, packet["name"], release["version"]), mirror) for mirror in ranked]
+
+    urls = []
+    for url in release["urls"]:
+        mirror = next((m for m in ranked if url.startswith(m.rstrip("/") + "/")), url)
+        urls.append((url, mirror))
+    urls.sort(key=lambda pair: ranked.index(pair[1]) if pair[1] in ranked else len(ranked))
+    return urls
+
+def part_size(path):
+    return os.path.getsize(path) if os.path.isfile(path) else 0
+
+def content_range_total(response):
+    total = response.headers.get("Content-Range", "").rpartition("/")[2]
+    return int(total) if total.isdigit() else None
+
+def stream_to_file(response, path, append=False, hasher=None, progress=None):
+    expected = response.headers.get("Content-Length", "")
+    expected = int(expected) if expected.isdigit() and "Content-Encoding" not in response.headers else None
+    if progress is not None and expected is not None:
+        progress.add_expected(expected)
+    received = 0
+    with open(path, "ab" if append else "wb") as file:
+        for chunk in response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+            received += len(chunk)
+            if expected is not None and received > expected:
+                raise Exception(f"Mirror sent more than the announced {expected} bytes")
+            if hasher is not None:
+                hasher.update(chunk)
+            file.write(chunk)
+            if progress is not None:
+                progress.add_bytes(len(chunk))
+    if expected is not None and received != expected:
+        raise Exception(f"Mirror response truncated ({received} of {expected} bytes)")
+    return received
+
+def segments_path(part_path):
+    return part_path + ".segments"
+
+def hash_range(path, start, end, hasher):
+    with open(path, "rb") as file:
+        file.seek(start)
+        remaining = end - start
+        while remaining > 0 and (chunk := file.read(min(DOWNLOAD_CHUNK_SIZE, remaining))):
+            hasher.update(chunk)
+            remaining -= len(chunk)
+
+def download_segment(url, part_path, ranges, done, index, hasher=None, progress=None):
+    start, end = ranges[index]
+    offset = start + done[index]
+    if offset <= end:
+        with http_request(url, headers={"Range": f"bytes={offset}-{end}"}, stream=True) as response:
+            response.raise_for_status()
+            if response.status_code != 206:
+                raise Exception("Mirror ignored byte range request")
+            with open(part_path, "r+b") as file:
+                file.seek(offset)
+                for chunk in response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                    if offset + len(chunk) > end + 1:
+                        raise Exception(f"Mirror sent more than segment {start}-{end}")
+                    file.write(chunk)
+                    if hasher is not None:
+                        hasher.update(chunk)
+                    offset += len(chunk)
+                    done[index] = offset - start
+                    if progress is not None:
+                        progress.add_bytes(len(chunk))
+    if done[index] != end - start + 1:
+        raise Exception(f"Segment {start}-{end} is incomplete")
+
+def download_segmented(url, part_path, total, progress=None):
+    size = -(-total // SEGMENT_COUNT)
+    ranges = [(start, min(start + size, total) - 1) for start in range(0, total, size)]
+
+    done = None
+    try:
+        with open(segments_path(part_path)) as f:
+            state = json.load(f)
+        if state["total"] == total and len(state["done"]) == len(ranges) and part_size(part_path) == total:
+            done = state["done"]
+    except (OSError, ValueError, KeyError):
+        pass
+    if done is None:
+        done = [0] * len(ranges)
+        with open(part_path, "wb") as file:
+            file.truncate(total)
+        with open(segments_path(part_path), "w") as f:
+            json.dump({"total": total, "done": done}, f)
+    if progress is not None:
+        progress.add_expected(total - sum(done))
+
+    # Segment 0 is hashed while it streams in; the rest is hashed from disk afterwards.
+    hasher = hashlib.sha1()
+    if done[0]:
+        hash_range(part_path, 0, done[0], hasher)
+
+    error = None
+    with ThreadPoolExecutor(max_workers=len(ranges)) as pool:
+        futures = [pool.submit(download_segment, url, part_path, ranges, done, i, hasher if i == 0 else None, progress) for i in range(len(ranges))]
+        for future in futures:
+            try:
+                future.result()
+            except Exception as e:
+                error = error or e
+    if error is not None:
+        with open(segments_path(part_path), "w") as f:
+            json.dump({"total": total, "done": done}, f)
+        raise error
+
+    hash_range(part_path, ranges[0][1] + 1, total, hasher)
+    if os.path.isfile(segments_path(part_path)):
+        os.remove(segments_path(part_path))
+    return hasher.hexdigest()
+
+def download_file(url, part_path, stats=None, claim=None, progress=None):
+    stats = stats if stats is not None else dict()
+    started = time.monotonic()
+    offset = 0 if os.path.isfile(segments_path(part_path)) else part_size(part_path)
+    with http_request(url, headers={"Range": f"bytes={offset}-"}, stream=True) as response:
+        stats["ttfb"] = time.monotonic() - started
+        resumable = response.status_code == 416 and offset > 0
+        if response.status_code not in (200, 206) and not resumable:
+            response.raise_for_status()
+            raise Exception(f"Unexpected response {response.status_code} from {url}")
+        if claim is not None and not claim():
+            return None
+
+        if resumable:
+            if content_range_total(response) == offset:
+                return hash_file(part_path)
+            os.remove(part_path)
+            offset = None
+        else:
+            total = content_range_total(response) if response.status_code == 206 else None
+            if offset > 0 or total is None or total < SEGMENT_THRESHOLD or SEGMENT_COUNT < 2:
+                hasher = hashlib.sha1()
+                resumed = response.status_code == 206
+                if resumed and offset > 0:
+                    hash_file(part_path, hasher)
+                if os.path.isfile(segments_path(part_path)):
+                    os.remove(segments_path(part_path))
+                stats["bytes"] = stream_to_file(response, part_path, append=resumed, hasher=hasher, progress=progress)
+                return hasher.hexdigest()
+
+    if offset is None:
+        return download_file(url, part_path, stats, progress=progress)
+    stats["bytes"] = total
+    return download_segmented(url, part_path, total, progress)
+
+def download_from_mirror(url, mirror, part_path, claim=None, progress=None):
+    stats = dict()
+    started = time.monotonic()
+    with span("download_attempt", mirror=mirror, url=url) as current:
+        try:
+            digest = download_file(url, part_path, stats, claim, progress)
+        except TransferCancelled:
+            raise
+        except Exception:
+            get_mirror_scheduler().record(mirror, error=True, ttfb=stats.get("ttfb"))
+            raise
+        finally:
+            current.bytes = stats.get("bytes", 0)
+            current.tag(ttfb=stats.get("ttfb"))
+        current.tag(result="won" if digest is not None else "lost")
+    if digest is not None:
+        get_mirror_scheduler().record(mirror, error=False, ttfb=stats.get("ttfb"), size=stats.get("bytes", 0),
+                                      duration=time.monotonic() - started - stats.get("ttfb", 0))
+    elif stats.get("ttfb") is not None:
+        get_mirror_scheduler().record(mirror, error=None, ttfb=stats["ttfb"])
+    return digest
+
+def download_hedged(candidates, part_path, hedge_delay=None, progress=None):
+    hedge_delay = hedge_delay if hedge_delay is not None else MIRROR_HEDGE_DELAY
+    condition = threading.Condition()
+    state = {"winner": None, "results": dict(), "started": dict(), "decided_at": None}
+
+    def claim(mirror):
+        with condition:
+            if state["winner"] is None:
+                state["winner"] = mirror
+                state["decided_at"] = time.monotonic()
+                condition.notify_all()
+            return state["winner"] == mirror
+
+    def run(url, mirror):
+        try:
+            result = (download_from_mirror(url, mirror, part_path, claim=lambda: claim(mirror), progress=progress), None)
+        except Exception as e:
+            result = (None, e)
+        with condition:
+            state["results"][mirror] = result
+            condition.notify_all()
+
+    def settled(started):
+        if state["winner"] is not None:
+            return state["winner"] in state["results"]
+        return all(mirror in state["results"] for _, mirror in started)
+
+    started = []
+    for url, mirror in candidates:
+        started.append((url, mirror))
+        state["started"][mirror] = time.monotonic()
+        threading.Thread(target=run, args=(url, mirror), daemon=True).start()
+        with condition:
+            condition.wait_for(lambda: state["winner"] is not None or settled(started), timeout=hedge_delay)
+            if state["winner"] is not None:
+                break
+
+    with condition:
+        condition.wait_for(lambda: settled(started))
+        winner = state["winner"]
+        failed = [mirror for _, mirror in started if state["results"].get(mirror, (None, None))[1] is not None]
+        if winner is not None:
+            # Losers that started no later than the winner were too slow to answer;
+            # record at least the time they had waited.
+            for _, mirror in started:
+                if mirror != winner and mirror not in failed and state["started"][mirror] <= state["started"][winner]:
+                    get_mirror_scheduler().record(mirror, error=MIRROR_LOSS_PENALTY, ttfb=state["decided_at"] - state["started"][mirror])
+        if winner is not None and winner not in failed:
+            return state["results"][winner][0], winner, failed, None
+        return None, None, failed, state["results"][failed[-1]][1]
+
+def download_mod(packet, ver, progress=None):
+    release = next((r for r in packet["releases"] if r["version"] == ver), None)
+    if not release:
+        raise Exception(f"Version {ver} not found in releases")
+
+    with inflight_lock:
+        future = inflight_downloads.get(release["sha1"])
+        owner = future is None
+        if owner:
+            future = Future()
+            inflight_downloads[release["sha1"]] = future
+
+    if not owner:
+        with span("download_mod", file=release["file_name"], cache="shared"):
+            future.result()
+        cli.print(f"[bold yellow]Shared in-flight download: {release['file_name']}[/bold yellow]")
+        return release
+
+    try:
+        with span("download_mod", file=release["file_name"]):
+            fetch_release(packet, release, progress)
+        future.set_result(release)
+    except Exception as e:
+        future.set_exception(e)
+        raise
+    finally:
+        with inflight_lock:
+            del inflight_downloads[release["sha1"]]
+    return release
+
+def fetch_release(packet, release, progress=None):
+    urls = build_download_urls(packet, release)
+    output_path = store_path(release["sha1"])
+    part_path = output_path + ".part"
+    legacy_path = os.path.join("mod_cache", release["file_name"])
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+
+    if not os.path.isfile(output_path) and os.path.isfile(legacy_path) and get_file_hash(legacy_path) == release["sha1"]:
+        os.replace(legacy_path, output_path)
+        get_cache_checksums().discard(legacy_path)
+
+    if os.path.isfile(output_path):
+        if release["sha1"] == get_file_hash(output_path) and not validate_archive(output_path, release["sha1"], release=release, name=packet.get("name"))[0]:
+            register_stored_file(release["file_name"], release["sha1"])
+            get_cache_manager().record_use(release["sha1"], hit=True)
+            trace_tag(cache="hit")
+            cli.print(f"[bold yellow]Using cached version: {release['file_name']}[/bold yellow]")
+            return release
+
+    trace_tag(cache="miss")
+    last_error = None
+    while urls:
+        candidates = urls[:2] if MIRROR_HEDGE_DELAY and len(urls) > 1 else urls[:1]
+        digest, winner, failed, error = download_hedged(candidates, part_path, progress=progress)
+        urls = [(url, mirror) for url, mirror in urls if mirror != winner and mirror not in failed]
+        if isinstance(error, TransferCancelled):
+            raise error
+        if error is not None:
+            last_error = error
+            continue
+
+        if digest != release["sha1"]:
+            get_mirror_scheduler().record(winner, error=True)
+            cli.print("[red]Hash mismatch, trying next mirror...[/red]")
+            os.remove(part_path)
+            continue
+
+        errors, warnings = validate_archive(part_path, digest, release=release, name=packet.get("name"))
+        for warning in warnings:
+            cli.print(f"[yellow]{release['file_name']}: {warning}[/yellow]")
+        if errors:
+            os.remove(part_path)
+            raise Exception(f"{release['file_name']} is not a valid mod archive: {'; '.join(errors)}")
+
+        os.replace(part_path, output_path)
+        get_cache_checksums().put(output_path, release["sha1"])
+        register_stored_file(release["file_name"], release["sha1"])
+        get_cache_manager().record_use(release["sha1"], hit=False)
+        cli.print(f"[bold green]Downloaded {release['file_name']}[/bold green]")
+        return release
+
+    cli.print(f"[red]Failed to download from all sources. Last error: {last_error}[/red]")
+    raise last_error if last_error is not None else Exception("Download failed")
\ No newline at end of file
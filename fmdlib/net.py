@@ -0,0 +1,80 @@
+import random
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+
+from . import core
+
+USER_AGENT = "Factorio-Agent"
+
+HTTP_TIMEOUT = (10, 30)
+HTTP_RETRIES = 4
+HTTP_BACKOFF = 0.5
+HTTP_BACKOFF_MAX = 30
+HTTP_POOL_SIZE = 16
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+DEFAULT_HOST_CONCURRENCY = 4
+HOST_CONCURRENCY = {
+    "mods.factorio.com": 8
+}
+
+http_session = None
+http_lock = threading.Lock()
+host_semaphores = dict()
+
+def get_http_session():
+    global http_session
+    with http_lock:
+        if http_session is None:
+            import requests
+            session = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(pool_connections=HTTP_POOL_SIZE, pool_maxsize=HTTP_POOL_SIZE)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            session.headers["User-Agent"] = USER_AGENT
+            http_session = session
+    return http_session
+
+def get_host_semaphore(url):
+    host = urlsplit(url).hostname or ""
+    with http_lock:
+        if host not in host_semaphores:
+            limit = core.host_concurrency.get(host, HOST_CONCURRENCY.get(host, DEFAULT_HOST_CONCURRENCY))
+            host_semaphores[host] = threading.BoundedSemaphore(limit)
+        return host_semaphores[host]
+
+def retry_delay(attempt, response=None):
+    retry_after = response.headers.get("Retry-After", "") if response is not None else ""
+    if retry_after.isdigit():
+        return min(float(retry_after), HTTP_BACKOFF_MAX)
+    return random.uniform(0, min(HTTP_BACKOFF_MAX, HTTP_BACKOFF * 2 ** attempt))
+
+@contextmanager
+def http_request(url, method="GET", headers=None, stream=False, timeout=HTTP_TIMEOUT, retries=HTTP_RETRIES):
+    import requests
+    with get_host_semaphore(url):
+        for attempt in range(retries + 1):
+            try:
+                response = get_http_session().request(method, url, headers=headers, stream=stream, timeout=timeout)
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt == retries:
+                    raise
+                time.sleep(retry_delay(attempt))
+                continue
+            if response.status_code in RETRY_STATUSES and attempt < retries:
+                delay = retry_delay(attempt, response)
+                response.close()
+                time.sleep(delay)
+                continue
+            break
+
+        try:
+            yield response
+        finally:
+            response.close()
+
+def http_get(url, headers=None, timeout=HTTP_TIMEOUT, retries=HTTP_RETRIES):
+    with http_request(url, headers=headers, timeout=timeout, retries=retries) as response:
+        response.content
+        return response
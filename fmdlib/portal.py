@@ -0,0 +1,482 @@
+import atexit
+import bisect
+import gzip
+import heapq
+import json
+import os
+import threading
+import time
+from urllib.parse import quote
+from collections import OrderedDict
+from collections.abc import Mapping
+from concurrent.futures import ThreadPoolExecutor, Future
+
+from . import core
+from .core import cli
+from .net import HTTP_TIMEOUT, HTTP_RETRIES, http_get
+from .trace import span, trace_tag
+
+MOD_PORTAL_API = os.environ.get("FMD_PORTAL_URL", "https://mods.factorio.com/api/mods")
+
+CATALOG_FILE = os.path.join("mod_cache", "catalog.json.gz")
+CATALOG_RETRY_FILE = os.path.join("mod_cache", "catalog_retry.json")
+CATALOG_REFRESH_WAIT = 3
+CATALOG_REFRESH_TIMEOUT = (3, 10)
+CATALOG_RETRY_DELAY = 15 * 60
+
+SEARCH_INDEX_FILE = os.path.join("mod_cache", "search_index.json.gz")
+SEARCH_INDEX_SUMMARIES = True
+SUMMARY_WEIGHT = 0.6
+
+METADATA_DIR = os.path.join("mod_cache", "metadata")
+METADATA_NEGATIVE_TTL = 5 * 60
+METADATA_MEMORY_SIZE = 512
+
+data_cache = None
+catalog = None
+metadata_memory = OrderedDict()
+metadata_lock = threading.Lock()
+catalog_lock = threading.Lock()
+executor = None
+catalog_refresh = None
+
+def get_data_cache():
+    return data_cache.result()
+
+def publish_catalog(snapshot):
+    global data_cache
+    future = Future()
+    future.set_result(snapshot)
+    data_cache = future
+
+def load_catalog_snapshot():
+    if not os.path.isfile(CATALOG_FILE):
+        return None
+    try:
+        with gzip.open(CATALOG_FILE, "rt", encoding="utf-8") as f:
+            snapshot = json.load(f)
+        if "results" not in snapshot:
+            return None
+        return snapshot
+    except:
+        return None
+
+def save_catalog_snapshot(snapshot):
+    temp = CATALOG_FILE + ".tmp"
+    with gzip.open(temp, "wt", encoding="utf-8", compresslevel=5) as f:
+        json.dump(snapshot, f, separators=(",", ":"))
+    os.replace(temp, CATALOG_FILE)
+
+def fetch_catalog(snapshot=None, timeout=HTTP_TIMEOUT, retries=HTTP_RETRIES):
+    headers = dict()
+    if snapshot is not None:
+        if snapshot.get("etag"):
+            headers["If-None-Match"] = snapshot["etag"]
+        if snapshot.get("last_modified"):
+            headers["If-Modified-Since"] = snapshot["last_modified"]
+
+    with span("fetch_catalog", conditional=bool(headers)) as current:
+        response = http_get(MOD_PORTAL_API + "?page_size=max", headers=headers, timeout=timeout, retries=retries)
+        current.tag(status=response.status_code)
+        current.bytes = len(response.content)
+    now = time.time()
+    if response.status_code == 304 and snapshot is not None:
+        snapshot["checked_at"] = now
+    else:
+        response.raise_for_status()
+        snapshot = {
+            "updated_at": now,
+            "checked_at": now,
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+            "results": response.json().get("results", [])
+        }
+
+    try:
+        save_catalog_snapshot(snapshot)
+        if os.path.isfile(CATALOG_RETRY_FILE):
+            os.remove(CATALOG_RETRY_FILE)
+    except Exception as e:
+        cli.print(f"[red]Could not save catalog snapshot: {e}[/red]")
+    return snapshot
+
+def catalog_retry_due():
+    try:
+        with open(CATALOG_RETRY_FILE) as f:
+            return time.time() >= json.load(f)["retry_at"]
+    except (OSError, ValueError, KeyError):
+        return True
+
+def catalog_refresh_failed(error):
+    cli.print(f"[yellow]Could not revalidate the Mod Portal catalog, using the local snapshot "
+              f"(next attempt in {CATALOG_RETRY_DELAY // 60} minutes): {error}[/yellow]")
+    try:
+        with open(CATALOG_RETRY_FILE, "w") as f:
+            json.dump({"retry_at": time.time() + CATALOG_RETRY_DELAY, "error": str(error)}, f)
+    except OSError:
+        pass
+
+def fetch_catalog_or_keep(snapshot):
+    try:
+        return fetch_catalog(snapshot)
+    except Exception as e:
+        if snapshot is None:
+            raise
+        catalog_refresh_failed(e)
+        return snapshot
+
+def refresh_catalog_background(snapshot):
+    global catalog_refresh
+
+    def refresh():
+        try:
+            refreshed = fetch_catalog(snapshot, timeout=CATALOG_REFRESH_TIMEOUT, retries=0)
+        except Exception as e:
+            catalog_refresh_failed(e)
+            return
+        publish_catalog(refreshed)
+
+    if catalog_refresh is None:
+        atexit.register(finish_catalog_refresh)
+    catalog_refresh = threading.Thread(target=refresh, daemon=True)
+    catalog_refresh.start()
+
+def finish_catalog_refresh(timeout=CATALOG_REFRESH_WAIT):
+    if catalog_refresh is not None and catalog_refresh.is_alive():
+        catalog_refresh.join(timeout)
+        if catalog_refresh.is_alive():
+            catalog_refresh_failed(f"no answer within {timeout}s")
+
+def build_data_cache(force_rebuild=False, revalidate=False):
+    global data_cache, executor
+    if data_cache is not None and not force_rebuild:
+        return
+
+    with span("build_data_cache") as current:
+        snapshot = load_catalog_snapshot()
+        if snapshot is None or force_rebuild:
+            current.tag(cache="miss")
+            if executor is None:
+                executor = ThreadPoolExecutor(max_workers=1)
+            data_cache = executor.submit(fetch_catalog_or_keep, snapshot)
+            return
+
+        stale = time.time() - snapshot.get("checked_at", 0) > core.catalog_ttl
+        current.tag(cache="stale" if stale else "hit")
+        retry = stale and catalog_retry_due()
+        if retry and revalidate:
+            snapshot = fetch_catalog_or_keep(snapshot)
+        publish_catalog(snapshot)
+        if retry and not revalidate:
+            refresh_catalog_background(snapshot)
+
+class ModView(Mapping):
+    __slots__ = ("entry",)
+
+    def __init__(self, entry):
+        self.entry = entry
+
+    def __getitem__(self, key):
+        if key == "releases" and "latest_release" in self.entry:
+            return [self.entry["latest_release"]]
+        if key == "latest_release":
+            raise KeyError(key)
+        return self.entry[key]
+
+    def __iter__(self):
+        for key in self.entry:
+            yield "releases" if key == "latest_release" else key
+
+    def __len__(self):
+        return len(self.entry)
+
+class ModCatalog:
+    def __init__(self, data):
+        self.data = data
+        self.results = data.get("results", [])
+        self.by_name = dict()
+        self.by_lower_name = dict()
+        self.by_owner = dict()
+        self.by_category = dict()
+        self.search_index = None
+
+        for entry in self.results:
+            name = entry["name"]
+            self.by_name[name] = entry
+            self.by_lower_name.setdefault(name.lower(), entry)
+            self.by_owner.setdefault(entry.get("owner", "").lower(), []).append(entry)
+            self.by_category.setdefault(entry.get("category") or "", []).append(entry)
+
+    def __len__(self):
+        return len(self.results)
+
+    def __contains__(self, name):
+        return name in self.by_name
+
+    def get(self, name):
+        entry = self.by_name.get(name)
+        if entry is None:
+            entry = self.by_lower_name.get(name.lower())
+        return ModView(entry) if entry is not None else None
+
+    def owned_by(self, owner):
+        return [ModView(entry) for entry in self.by_owner.get(owner.lower(), [])]
+
+    def in_category(self, category):
+        return [ModView(entry) for entry in self.by_category.get(category, [])]
+
+def trigrams(text):
+    text = f"  {text.lower()} "
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+class SearchIndex:
+    def __init__(self, catalog, names, postings):
+        self.catalog = catalog
+        self.entries = [catalog.by_name.get(name) for name in names]
+        self.postings = postings
+        self.prefix_keys = sorted(
+            (key, i) for i, entry in enumerate(self.entries) if entry is not None
+            for key in {entry["name"].lower(), entry.get("title", "").lower()}
+        )
+
+    @staticmethod
+    def build(catalog):
+        postings = dict()
+        names = []
+        for i, entry in enumerate(catalog.results):
+            names.append(entry["name"])
+            grams = trigrams(entry["name"]) | trigrams(entry.get("title", ""))
+            if SEARCH_INDEX_SUMMARIES:
+                grams |= trigrams(entry.get("summary", ""))
+            for gram in grams:
+                postings.setdefault(gram, []).append(i)
+        return SearchIndex(catalog, names, postings)
+
+    @staticmethod
+    def load(catalog):
+        stamp = catalog.data.get("updated_at")
+        if stamp is not None and os.path.isfile(SEARCH_INDEX_FILE):
+            try:
+                with gzip.open(SEARCH_INDEX_FILE, "rt", encoding="utf-8") as f:
+                    data = json.load(f)
+                if data.get("stamp") == stamp and data.get("summaries") == SEARCH_INDEX_SUMMARIES:
+                    return SearchIndex(catalog, data["names"], data["postings"])
+            except:
+                pass
+
+        index = SearchIndex.build(catalog)
+        if stamp is not None:
+            index.save(stamp)
+        return index
+
+    def save(self, stamp):
+        data = {
+            "stamp": stamp,
+            "summaries": SEARCH_INDEX_SUMMARIES,
+            "names": [entry["name"] for entry in self.entries],
+            "postings": self.postings
+        }
+        try:
+            temp = SEARCH_INDEX_FILE + ".tmp"
+            with gzip.open(temp, "wt", encoding="utf-8", compresslevel=5) as f:
+                json.dump(data, f, separators=(",", ":"))
+            os.replace(temp, SEARCH_INDEX_FILE)
+        except:
+            pass
+
+    def score(self, query_grams, entry):
+        size = len(query_grams)
+        best = 0
+        for text, weight in ((entry["name"], 1), (entry.get("title", ""), .95)):
+            grams = trigrams(text)
+            best = max(best, weight * 2 * len(query_grams & grams) / (size + len(grams)))
+        if SEARCH_INDEX_SUMMARIES:
+            best = max(best, SUMMARY_WEIGHT * len(query_grams & trigrams(entry.get("summary", ""))) / size)
+        return best
+
+    def upper_bound(self, size, shared):
+        bound = 2 * shared / (size + shared)
+        if SEARCH_INDEX_SUMMARIES:
+            bound = max(bound, SUMMARY_WEIGHT * shared / size)
+        return bound
+
+    def search(self, query, limit=5):
+        if limit <= 0:
+            return []
+        query_grams = trigrams(query.strip())
+        size = len(query_grams)
+        counts = dict()
+        for gram in query_grams:
+            for i in self.postings.get(gram, ()):
+                counts[i] = counts.get(i, 0) + 1
+
+        heap = []
+        for i, shared in sorted(counts.items(), key=lambda p: (-p[1], p[0])):
+            if len(heap) == limit and self.upper_bound(size, shared) <= heap[0][0]:
+                break
+            entry = self.entries[i]
+            if entry is None:
+                continue
+            item = (self.score(query_grams, entry), -i)
+            if len(heap) < limit:
+                heapq.heappush(heap, item)
+            elif item > heap[0]:
+                heapq.heapreplace(heap, item)
+
+        heap.sort(reverse=True)
+        return [(ModView(self.entries[-i]), score) for score, i in heap]
+
+    def prefix(self, query, limit=10):
+        query = query.strip().lower()
+        matches = set()
+        start = bisect.bisect_left(self.prefix_keys, (query, -1))
+        for key, i in self.prefix_keys[start:]:
+            if not key.startswith(query):
+                break
+            matches.add(i)
+        best = heapq.nlargest(limit, matches, key=lambda i: (self.entries[i].get("downloads_count", 0), -i))
+        return [ModView(self.entries[i]) for i in best]
+
+def get_search_index():
+    current = get_catalog()
+    if current.search_index is None:
+        current.search_index = SearchIndex.load(current)
+    return current.search_index
+
+def get_catalog():
+    global catalog
+    data = get_data_cache()
+    with catalog_lock:
+        if catalog is None or catalog.data is not data:
+            catalog = ModCatalog(data)
+        return catalog
+
+def metadata_path(name):
+    return os.path.join(METADATA_DIR, quote(name, safe="") + ".json")
+
+def load_metadata_entry(name):
+    with metadata_lock:
+        if name in metadata_memory:
+            metadata_memory.move_to_end(name)
+            return metadata_memory[name]
+    try:
+        with open(metadata_path(name)) as f:
+            entry = json.load(f)
+    except (OSError, ValueError):
+        return None
+    remember_metadata_entry(name, entry)
+    return entry
+
+def remember_metadata_entry(name, entry):
+    with metadata_lock:
+        metadata_memory[name] = entry
+        metadata_memory.move_to_end(name)
+        while len(metadata_memory) > METADATA_MEMORY_SIZE:
+            metadata_memory.popitem(last=False)
+
+def store_metadata_entry(name, entry):
+    remember_metadata_entry(name, entry)
+    try:
+        os.makedirs(METADATA_DIR, exist_ok=True)
+        path = metadata_path(name)
+        temp = f"{path}.{threading.get_ident()}.tmp"
+        with open(temp, "w") as f:
+            json.dump(entry, f, separators=(",", ":"))
+        os.replace(temp, path)
+    except OSError:
+        pass
+
+def has_release(data, ver):
+    return any(r.get("version") == ver for r in data.get("releases", []))
+
+def get_full_mod_info(name, need_version=None, limiter=None):
+    entry = load_metadata_entry(name)
+    if entry is not None:
+        age = time.time() - entry["fetched_at"]
+        if entry["status"] == 404:
+            if age < METADATA_NEGATIVE_TTL:
+                trace_tag(cache="negative")
+                return entry["data"]
+        elif age < core.metadata_ttl:
+            trace_tag(cache="hit")
+            return entry["data"]
+        elif need_version is not None and has_release(entry["data"], need_version):
+            trace_tag(cache="hit")
+            return entry["data"]
+
+    headers = dict()
+    if entry is not None and entry["status"] == 200:
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+
+    query = MOD_PORTAL_API + "/" + name.replace(" ", "%20") + "/full"
+    if limiter is not None:
+        with span("rate_limit_wait"):
+            limiter.wait()
+    try:
+        response = http_get(query, headers=headers)
+    except Exception as e:
+        if entry is not None and entry["status"] == 200:
+            trace_tag(cache="stale")
+            return entry["data"]
+        trace_tag(cache="error")
+        return {"message": str(e)}
+
+    trace_tag(cache="revalidated" if response.status_code == 304 else "miss", status=response.status_code)
+    if response.status_code == 304 and entry is not None:
+        entry = dict(entry, fetched_at=time.time())
+    elif response.status_code == 404:
+        try:
+            message = response.json().get("message", "Mod not found")
+        except ValueError:
+            message = "Mod not found"
+        entry = {"status": 404, "fetched_at": time.time(), "data": {"message": message}}
+    else:
+        try:
+            response.raise_for_status()
+            data = response.json()
+        except Exception as e:
+            if entry is not None and entry["status"] == 200:
+                return entry["data"]
+            return {"message": str(e)}
+        entry = {
+            "status": 200,
+            "fetched_at": time.time(),
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+            "data": data
+        }
+
+    store_metadata_entry(name, entry)
+    return entry["data"]
+
+def get_mod_info(name, detailed=False, need_version=None, limiter=None):
+    with span("get_mod_info", mod=name, detailed=detailed):
+        if detailed:
+            return get_full_mod_info(name, need_version=need_version, limiter=limiter)
+
+        match = get_catalog().get(name)
+        if match is not None:
+            trace_tag(cache="hit")
+            return match
+
+        trace_tag(cache="miss")
+        query = MOD_PORTAL_API + "/" + name.replace(" ", "%20")
+        try:
+            response = http_get(query)
+            response.raise_for_status()
+            result = json.loads(response.text)
+            return result
+        except Exception as e:
+            return {"message": str(e)}
+
+def is_error_packet(modpacket):
+    return modpacket is not None and "message" in modpacket.keys()
+
+def search(query, max_similar=5):
+    return get_search_index().search(query.lower(), limit=max_similar)
+
+def suggest(query, limit=10):
+    return get_search_index().prefix(query, limit=limit)
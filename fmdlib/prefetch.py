@@ -0,0 +1,189 @@
+import os
+import platform
+import threading
+import time
+
+from . import core
+from .core import IGNORED_MODS, cli, format_size
+from .download import TYPICAL_MOD_SIZE, TransferCancelled, download_mod
+from .portal import build_data_cache, get_catalog
+from .store import inflight_downloads, inflight_lock, get_cache_manager, store_path
+from .sync import flush_caches
+from .trace import span
+
+PREFETCH_IDLE_WAIT = 2
+PREFETCH_NICENESS = 10
+
+prefetch_active = set()
+prefetch_status = {"state": "idle"}
+prefetch_stop = threading.Event()
+prefetch_thread = None
+
+class PrefetchThrottle:
+    def __init__(self, bandwidth, stop):
+        self.bandwidth = bandwidth
+        self.stop = stop
+        self.lock = threading.Lock()
+        self.started = time.monotonic()
+        self.sent = 0
+
+    def add_expected(self, count):
+        pass
+
+    def add_bytes(self, count):
+        if self.stop.is_set():
+            raise TransferCancelled("Prefetch stopped")
+        while foreground_busy():
+            paused = time.monotonic()
+            if self.stop.wait(PREFETCH_IDLE_WAIT):
+                raise TransferCancelled("Prefetch stopped")
+            with self.lock:
+                self.started += time.monotonic() - paused
+        if not self.bandwidth:
+            return
+        with self.lock:
+            self.sent += count
+            ahead = self.sent / self.bandwidth - (time.monotonic() - self.started)
+        if ahead > 0:
+            time.sleep(ahead)
+
+def foreground_busy():
+    with inflight_lock:
+        return any(sha1 not in prefetch_active for sha1 in inflight_downloads)
+
+def lower_priority(whole_process=False):
+    try:
+        if whole_process and hasattr(os, "nice"):
+            os.nice(PREFETCH_NICENESS)
+        elif platform.system() == "Linux":
+            os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), PREFETCH_NICENESS)
+    except OSError:
+        pass
+
+def parse_quiet_hours(text):
+    windows = []
+    for part in (text or "").split(","):
+        if not part.strip():
+            continue
+        try:
+            start, end = [time.strptime(t.strip(), "%H:%M") for t in part.split("-")]
+        except ValueError:
+            raise ValueError(f"invalid quiet hours '{part.strip()}', expected HH:MM-HH:MM")
+        windows.append((start.tm_hour * 60 + start.tm_min, end.tm_hour * 60 + end.tm_min))
+    return windows
+
+def in_quiet_hours(windows, now=None):
+    now = time.localtime(now)
+    now = now.tm_hour * 60 + now.tm_min
+    for start, end in windows:
+        if (start <= now < end) if start <= end else (now >= start or now < end):
+            return True
+    return False
+
+def prefetch_targets(top, watchlist):
+    catalog = get_catalog()
+    targets = dict()
+    for name in watchlist:
+        entry = catalog.by_name.get(name) or catalog.by_lower_name.get(name.lower())
+        if entry is None:
+            cli.print(f"[yellow]Watched mod {name} is not on the Mod Portal[/yellow]")
+        elif entry.get("latest_release"):
+            targets[entry["name"]] = (entry, "watched")
+    popular = [entry for entry in catalog.results if entry["name"] not in IGNORED_MODS and entry.get("latest_release")]
+    popular.sort(key=lambda entry: entry.get("downloads_count", 0), reverse=True)
+    for entry in popular[:top]:
+        targets.setdefault(entry["name"], (entry, "popular"))
+    return [(entry, entry["latest_release"], reason) for entry, reason in targets.values()]
+
+def prefetch_mods(top, watchlist, bandwidth=0, quiet_hours="", stop=None, dry_run=False):
+    stop = stop if stop is not None else threading.Event()
+    windows = parse_quiet_hours(quiet_hours)
+    targets = prefetch_targets(top, watchlist)
+    summary = {"selected": len(targets), "warm": 0, "fetched": 0, "bytes": 0, "failed": [], "state": "done", "targets": []}
+    throttle = PrefetchThrottle(bandwidth, stop)
+    used = get_cache_manager().stats()["size"]
+
+    with span("prefetch", targets=len(targets)):
+        for entry, release, reason in targets:
+            cached = os.path.isfile(store_path(release["sha1"]))
+            summary["targets"].append((entry["name"], release["version"], reason, cached))
+            if dry_run:
+                continue
+            if cached:
+                summary["warm"] += 1
+                continue
+            if in_quiet_hours(windows):
+                summary["state"] = "quiet hours"
+                break
+            if used + release.get("file_size", TYPICAL_MOD_SIZE) > core.cache_budget:
+                summary["state"] = "cache budget reached"
+                break
+            while foreground_busy() and not stop.is_set():
+                stop.wait(PREFETCH_IDLE_WAIT)
+            if stop.is_set():
+                summary["state"] = "stopped"
+                break
+
+            with inflight_lock:
+                prefetch_active.add(release["sha1"])
+            try:
+                download_mod(dict(entry, releases=[release]), release["version"], progress=throttle)
+                size = os.path.getsize(store_path(release["sha1"]))
+                used += size
+                summary["bytes"] += size
+                summary["fetched"] += 1
+            except TransferCancelled:
+                summary["state"] = "stopped"
+                break
+            except Exception as e:
+                cli.print(f"[bold red]Prefetch of {entry['name']} failed: {e}[/bold red]")
+                summary["failed"].append(entry["name"])
+            finally:
+                with inflight_lock:
+                    prefetch_active.discard(release["sha1"])
+    flush_caches()
+    return summary
+
+def run_prefetcher():
+    lower_priority()
+    while not prefetch_stop.is_set():
+        prefetch_status.update(state="running", started_at=time.time())
+        try:
+            build_data_cache()
+            summary = prefetch_mods(core.prefetch_top, core.prefetch_watchlist, core.prefetch_bandwidth, core.prefetch_quiet_hours, stop=prefetch_stop)
+            del summary["targets"]
+            prefetch_status.update(summary, finished_at=time.time())
+        except Exception as e:
+            prefetch_status.update(state="error", message=str(e), finished_at=time.time())
+        prefetch_stop.wait(core.prefetch_interval)
+
+def start_prefetcher():
+    global prefetch_thread
+    if not (core.prefetch_top or core.prefetch_watchlist) or (prefetch_thread is not None and prefetch_thread.is_alive()):
+        return
+    prefetch_stop.clear()
+    prefetch_thread = threading.Thread(target=run_prefetcher, daemon=True, name="fmd-prefetch")
+    prefetch_thread.start()
+    cli.print(f"[yellow]Prefetching the top {core.prefetch_top} mods and {len(core.prefetch_watchlist)} watched mods in the background.[/yellow]")
+
+def stop_prefetcher():
+    prefetch_stop.set()
+
+def display_prefetch(summary, dry_run=False):
+    from rich.table import Table
+    if dry_run:
+        table = Table(title="[bold green]Prefetch plan[/bold green]")
+        table.add_column("[green]Mod[/green]")
+        table.add_column("[green]Version[/green]")
+        table.add_column("[green]Reason[/green]")
+        table.add_column("[green]Cached[/green]")
+        for name, ver, reason, cached in summary["targets"]:
+            table.add_row(name, ver, reason, "[green]yes[/green]" if cached else "[bright_black]no[/bright_black]")
+        cli.print(table)
+        return
+    cli.print(
+        f"[bold green]Prefetch {summary['state']}:[/bold green] {summary['selected']} selected, "
+        f"{summary['warm']} already cached, {summary['fetched']} fetched ({format_size(summary['bytes'])})"
+    )
+    if summary["failed"]:
+        cli.print(f"[red]Failed: {', '.join(summary['failed'])}[/red]")
@@ -0,0 +1,413 @@
+import bisect
+import re
+import threading
+import time
+from packaging import version
+
+from .core import IGNORED_MODS
+from .portal import get_mod_info, is_error_packet
+from .workers import offload, run_async, cancel_tasks
+
+RESOLVE_WORKERS = 8
+RESOLVE_MAX_STEPS = 100000
+
+DEP_KINDS = {"!": "conflict", "?": "optional", "(?)": "hidden", "~": "no-order"}
+DEP_PATTERN = re.compile(r"^\s*(\(\?\)|[!?~])?\s*(.+?)\s*(?:(<=|>=|==|=|<|>)\s*(\S+))?\s*$")
+
+dep_specs = dict()
+parsed_versions = dict()
+
+def parse_version(text):
+    parsed = parsed_versions.get(text)
+    if parsed is None:
+        parsed = parsed_versions[text] = version.parse(text)
+    return parsed
+
+class VersionRange:
+    __slots__ = ("low", "low_closed", "high", "high_closed")
+
+    def __init__(self, low=None, low_closed=True, high=None, high_closed=True):
+        self.low = low
+        self.low_closed = low_closed
+        self.high = high
+        self.high_closed = high_closed
+
+    @staticmethod
+    def from_op(op, ver):
+        if op == ">":
+            return VersionRange(low=ver, low_closed=False)
+        if op == ">=":
+            return VersionRange(low=ver)
+        if op == "<":
+            return VersionRange(high=ver, high_closed=False)
+        if op == "<=":
+            return VersionRange(high=ver)
+        return VersionRange(ver, True, ver, True)
+
+    def intersect(self, other):
+        low, low_closed = self.low, self.low_closed
+        if other.low is not None and (low is None or other.low > low or (other.low == low and not other.low_closed)):
+            low, low_closed = other.low, other.low_closed
+        high, high_closed = self.high, self.high_closed
+        if other.high is not None and (high is None or other.high < high or (other.high == high and not other.high_closed)):
+            high, high_closed = other.high, other.high_closed
+        return VersionRange(low, low_closed, high, high_closed)
+
+    def empty(self):
+        if self.low is None or self.high is None:
+            return False
+        return self.low > self.high or (self.low == self.high and not (self.low_closed and self.high_closed))
+
+    def select(self, versions):
+        start = 0
+        if self.low is not None:
+            start = (bisect.bisect_left if self.low_closed else bisect.bisect_right)(versions, self.low)
+        end = len(versions)
+        if self.high is not None:
+            end = (bisect.bisect_right if self.high_closed else bisect.bisect_left)(versions, self.high)
+        return start, max(start, end)
+
+    def __contains__(self, ver):
+        if self.low is not None and (ver < self.low or (ver == self.low and not self.low_closed)):
+            return False
+        if self.high is not None and (ver > self.high or (ver == self.high and not self.high_closed)):
+            return False
+        return True
+
+    def key(self):
+        return (self.low, self.low_closed, self.high, self.high_closed)
+
+    def __eq__(self, other):
+        return isinstance(other, VersionRange) and self.key() == other.key()
+
+    def __hash__(self):
+        return hash(self.key())
+
+    def __str__(self):
+        if self.low is not None and self.low == self.high:
+            return f"= {self.low}"
+        parts = []
+        if self.low is not None:
+            parts.append(f"{'>=' if self.low_closed else '>'} {self.low}")
+        if self.high is not None:
+            parts.append(f"{'<=' if self.high_closed else '<'} {self.high}")
+        return ", ".join(parts) or "any"
+
+ANY_VERSION = VersionRange()
+
+class DepSpec:
+    __slots__ = ("kind", "name", "op", "version", "range")
+
+    def __init__(self, kind, name, op=None, ver=None):
+        self.kind = kind
+        self.name = name
+        self.op = op
+        self.version = ver
+        self.range = VersionRange.from_op(op, parse_version(ver)) if op else ANY_VERSION
+
+    @staticmethod
+    def parse(code):
+        match = DEP_PATTERN.match(code)
+        if match is None:
+            return DepSpec("required", code.strip())
+        prefix, name, op, ver = match.groups()
+        kind = DEP_KINDS.get(prefix, "required")
+        if op is not None:
+            try:
+                return DepSpec(kind, name, "=" if op == "==" else op, ver)
+            except version.InvalidVersion:
+                pass
+        return DepSpec(kind, name)
+
+    @property
+    def required(self):
+        return self.kind in ("required", "no-order")
+
+    @property
+    def conflict(self):
+        return self.kind == "conflict"
+
+    def accepts(self, ver):
+        return ver in self.range
+
+    def key(self):
+        return (self.kind, self.name, self.op, self.version)
+
+    def __eq__(self, other):
+        return isinstance(other, DepSpec) and self.key() == other.key()
+
+    def __hash__(self):
+        return hash(self.key())
+
+    def __repr__(self):
+        return f"DepSpec({self.kind!r}, {self.name!r}, {self.op!r}, {self.version!r})"
+
+    def __str__(self):
+        return f"{self.name} {self.op} {self.version}" if self.op else self.name
+
+def parse_dep(code):
+    spec = dep_specs.get(code)
+    if spec is None:
+        spec = dep_specs[code] = DepSpec.parse(code)
+    return spec
+
+def release_versions(releases, factorio_version=None):
+    parsed = []
+    for release in releases:
+        game_ver = release.get("info_json", {}).get("factorio_version")
+        if factorio_version and game_ver and game_ver != factorio_version:
+            continue
+        try:
+            parsed.append((parse_version(release["version"]), release))
+        except (version.InvalidVersion, KeyError, TypeError):
+            continue
+    parsed.sort(key=lambda p: p[0])
+    return [ver for ver, _ in parsed], [release for _, release in parsed]
+
+def latest_release(releases):
+    _, ordered = release_versions(releases)
+    return ordered[-1] if ordered else None
+
+class RateLimiter:
+    def __init__(self, min_interval):
+        self.min_interval = min_interval
+        self.next_time = 0
+        self.lock = threading.Lock()
+
+    def wait(self):
+        with self.lock:
+            now = time.monotonic()
+            delay = self.next_time - now
+            self.next_time = max(now, self.next_time) + self.min_interval
+        if delay > 0:
+            time.sleep(delay)
+
+class ResolutionError(Exception):
+    pass
+
+class MissingMetadata(Exception):
+    def __init__(self, names):
+        super().__init__(", ".join(names))
+        self.names = names
+
+def root_dep(mod_name, ver="latest"):
+    if ver and ver != "latest":
+        return parse_dep(f"{mod_name} = {ver}")
+    return parse_dep(mod_name)
+
+class DependencyResolver:
+    def __init__(self, infos, factorio_version=None, skip=(), max_steps=RESOLVE_MAX_STEPS):
+        self.infos = infos
+        self.factorio_version = factorio_version
+        self.skip = set(skip) | IGNORED_MODS
+        self.max_steps = max_steps
+        self.candidates = dict()
+        self.deps = dict()
+        self.assignment = dict()
+        self.constraints = dict()
+        self.conflicts = dict()
+        self.agenda = []
+        self.queued = set()
+        self.failures = dict()
+
+    def get_candidates(self, name):
+        if name not in self.candidates:
+            info = self.infos[name]
+            releases = [] if is_error_packet(info) else info.get("releases", [])
+            self.candidates[name] = release_versions(releases, self.factorio_version)
+        return self.candidates[name]
+
+    def get_deps(self, release):
+        key = id(release)
+        if key not in self.deps:
+            deps = [parse_dep(code) for code in release.get("info_json", {}).get("dependencies", [])]
+            self.deps[key] = [dep for dep in deps if dep.name not in self.skip]
+        return self.deps[key]
+
+    def add_root(self, dep):
+        if dep.name in self.skip:
+            return
+        self.constraints.setdefault(dep.name, []).append(("requested", None, dep))
+        if dep.name not in self.queued:
+            self.queued.add(dep.name)
+            self.agenda.append(dep.name)
+
+    def options(self, name):
+        if self.conflicts.get(name):
+            return []
+        allowed = ANY_VERSION
+        for _, _, dep in self.constraints.get(name, []):
+            allowed = allowed.intersect(dep.range)
+        if allowed.empty():
+            return []
+        versions, releases = self.get_candidates(name)
+        start, end = allowed.select(versions)
+        return [(versions[i], releases[i]) for i in range(end - 1, start - 1, -1)]
+
+    def rejection(self, deps):
+        for dep in deps:
+            assigned = self.assignment.get(dep.name)
+            if assigned is None:
+                continue
+            if dep.conflict:
+                return f"conflicts with {dep.name} {assigned[0]}"
+            if not dep.accepts(assigned[0]):
+                return f"requires {dep} but {dep.name} {assigned[0]} is selected"
+        return None
+
+    def push(self, name, ver, release, deps):
+        mark = len(self.agenda)
+        self.assignment[name] = (ver, release)
+        for dep in deps:
+            if dep.conflict:
+                self.conflicts.setdefault(dep.name, []).append(name)
+                continue
+            self.constraints.setdefault(dep.name, []).append((name, ver, dep))
+            if dep.required and dep.name not in self.queued:
+                self.queued.add(dep.name)
+                self.agenda.append(dep.name)
+        return mark
+
+    def pop(self, name, deps, mark):
+        del self.assignment[name]
+        for dep in reversed(deps):
+            if dep.conflict:
+                self.conflicts[dep.name].pop()
+            else:
+                self.constraints[dep.name].pop()
+        for queued in self.agenda[mark:]:
+            self.queued.discard(queued)
+        del self.agenda[mark:]
+
+    def record_failure(self, name, rejected=()):
+        reasons = []
+        info = self.infos[name]
+        if is_error_packet(info):
+            reasons.append(f"not available on the Mod Portal ({info.get('message', 'Unknown Error')})")
+        for source, ver, dep in self.constraints.get(name, []):
+            requirement = str(dep)
+            reasons.append(requirement if source == "requested" else f"{requirement} (required by {source} {ver})")
+        for source in self.conflicts.get(name, []):
+            reasons.append(f"conflicts with {source} {self.assignment[source][0]}")
+        reasons.extend(rejected)
+        if self.factorio_version:
+            reasons.append(f"Factorio {self.factorio_version}")
+        count, _ = self.failures.get(name, (0, None))
+        self.failures[name] = (count + 1, reasons)
+
+    def explain(self):
+        if not self.failures:
+            return "no consistent set of versions found"
+        name, (_, reasons) = max(self.failures.items(), key=lambda item: item[1][0])
+        available = ", ".join(str(ver) for ver in self.get_candidates(name)[0]) or "none"
+        return f"no release of {name} satisfies: " + "; ".join(reasons) + f" (available: {available})"
+
+    def solve(self):
+        stack = []
+        steps = 0
+        while len(stack) < len(self.agenda):
+            name = self.agenda[len(stack)]
+            missing = [n for n in self.agenda[len(stack):] if n not in self.infos]
+            if missing:
+                raise MissingMetadata(missing)
+
+            options = self.options(name)
+            if not options:
+                self.record_failure(name)
+            stack.append([name, iter(options), None, []])
+
+            while stack:
+                steps += 1
+                if steps > self.max_steps:
+                    raise ResolutionError(f"gave up after {self.max_steps} steps, " + self.explain())
+
+                frame = stack[-1]
+                if frame[2] is not None:
+                    self.pop(frame[0], *frame[2])
+                    frame[2] = None
+                for ver, release in frame[1]:
+                    deps = self.get_deps(release)
+                    reason = self.rejection(deps)
+                    if reason is None:
+                        frame[2] = (deps, self.push(frame[0], ver, release, deps))
+                        break
+                    frame[3].append(f"{frame[0]} {ver} {reason}")
+                if frame[2] is not None:
+                    break
+                if frame[3]:
+                    self.record_failure(frame[0], frame[3])
+                stack.pop()
+            else:
+                raise ResolutionError(self.explain())
+
+        return [(name, self.assignment[name][1]) for name in self.agenda]
+
+def resolve_mods(roots, infos=None, skip=(), factorio_version=None, min_delay=.05, workers=RESOLVE_WORKERS):
+    infos = infos if infos is not None else dict()
+    limiter = RateLimiter(min_delay)
+    pinned = {dep.name: dep.version for dep in roots if dep.op == "="}
+
+    def fetch_info(name):
+        return get_mod_info(name, detailed=True, need_version=pinned.get(name), limiter=limiter)
+
+    def prefetch(names):
+        run_async(prefetch_metadata(names, infos, fetch_info, skip=skip, workers=workers))
+
+    prefetch([dep.name for dep in roots])
+
+    if factorio_version is None:
+        game_versions = []
+        for dep in roots:
+            info = infos.get(dep.name)
+            if info is None or is_error_packet(info):
+                continue
+            versions, releases = release_versions(info.get("releases", []))
+            start, end = dep.range.select(versions)
+            if end > start:
+                game_ver = releases[end - 1].get("info_json", {}).get("factorio_version")
+                if game_ver:
+                    game_versions.append(game_ver)
+        if game_versions:
+            factorio_version = max(game_versions, key=version.parse)
+
+    while True:
+        resolver = DependencyResolver(infos, factorio_version=factorio_version, skip=skip)
+        for dep in roots:
+            resolver.add_root(dep)
+        try:
+            return resolver.solve()
+        except MissingMetadata as e:
+            prefetch(e.names)
+
+async def prefetch_metadata(names, infos, fetch_info, skip=(), workers=RESOLVE_WORKERS):
+    import asyncio
+    semaphore = asyncio.Semaphore(workers)
+    seen = set(infos) | IGNORED_MODS | set(skip)
+    tasks = set()
+
+    async def fetch(name):
+        async with semaphore:
+            infos[name] = await offload("io", fetch_info, name)
+        latest = None if is_error_packet(infos[name]) else latest_release(infos[name].get("releases", []))
+        if latest is not None:
+            for dep_code in latest.get("info_json", {}).get("dependencies", []):
+                dep = parse_dep(dep_code)
+                if dep.required:
+                    schedule(dep.name)
+
+    def schedule(name):
+        if name not in seen:
+            seen.add(name)
+            tasks.add(asyncio.ensure_future(fetch(name)))
+
+    for name in names:
+        schedule(name)
+    try:
+        while tasks:
+            done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+            tasks.difference_update(done)
+            for task in done:
+                task.result()
+    except BaseException:
+        await cancel_tasks(list(tasks))
+        raise
@@ -0,0 +1,377 @@
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+
+from . import core
+from .core import DOWNLOAD_CHUNK_SIZE, cli, state_lock, check_dirs, check_factorio_path_set, format_size, get_instances
+from .portal import metadata_lock, metadata_memory
+from .trace import span
+
+STORE_DIR = os.path.join("mod_cache", "store")
+STORE_INDEX_FILE = os.path.join(STORE_DIR, "index.json")
+CACHE_USAGE_FILE = os.path.join(STORE_DIR, "usage.json")
+CHECKSUM_FILE = os.path.join("mod_cache", "checksums.json")
+CHECKSUM_JOURNAL = os.path.join("mod_cache", "checksums.journal")
+
+checksums = None
+store_index = None
+store_lock = threading.Lock()
+store_dirty = False
+inflight_downloads = dict()
+inflight_lock = threading.Lock()
+cache_manager = None
+
+def clear_cache():
+    global checksums, store_index, cache_manager
+    if os.path.isdir("mod_cache"):
+        shutil.rmtree("mod_cache")
+        checksums = None
+        store_index = None
+        cache_manager = None
+        with metadata_lock:
+            metadata_memory.clear()
+        check_dirs()
+
+def hash_file(filename, h=None):
+    h = h if h is not None else hashlib.sha1()
+    with span("hash_file", file=os.path.basename(filename)) as current:
+        with open(filename,'rb') as file:
+            while chunk := file.read(DOWNLOAD_CHUNK_SIZE):
+                h.update(chunk)
+                current.bytes += len(chunk)
+    return h.hexdigest()
+
+class ChecksumStore:
+    def __init__(self, path=CHECKSUM_FILE, journal_path=CHECKSUM_JOURNAL):
+        self.path = path
+        self.journal_path = journal_path
+        self.entries = None
+        self.dirty = False
+        self.lock = threading.RLock()
+
+    def load(self):
+        if self.entries is not None:
+            return
+        entries = dict()
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+            if data.get("version") == 2:
+                entries = data.get("entries", dict())
+        except:
+            pass
+
+        if os.path.isfile(self.journal_path):
+            with open(self.journal_path) as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue
+                    if len(record) == 1:
+                        entries.pop(record[0], None)
+                    else:
+                        entries[record[0]] = record[1:]
+            self.dirty = True
+        self.entries = entries
+
+    @staticmethod
+    def stat_key(path):
+        st = os.stat(path)
+        return [st.st_size, st.st_mtime_ns, st.st_ino]
+
+    def journal(self, record):
+        with open(self.journal_path, "a") as f:
+            f.write(json.dumps(record, separators=(",", ":")) + "\n")
+        self.dirty = True
+
+    def get(self, path):
+        with self.lock:
+            self.load()
+            entry = self.entries.get(path)
+        if entry is None:
+            return None
+        try:
+            if entry[:3] == self.stat_key(path):
+                return entry[3]
+        except OSError:
+            pass
+        self.discard(path)
+        return None
+
+    def put(self, path, sha1):
+        entry = self.stat_key(path) + [sha1]
+        with self.lock:
+            self.load()
+            self.entries[path] = entry
+            self.journal([path] + entry)
+
+    def discard(self, path):
+        with self.lock:
+            self.load()
+            if self.entries.pop(path, None) is not None:
+                self.journal([path])
+
+    def flush(self):
+        with self.lock:
+            if not self.dirty or self.entries is None:
+                return
+            temp = self.path + ".tmp"
+            with open(temp, "w") as f:
+                json.dump({"version": 2, "entries": self.entries}, f, separators=(",", ":"))
+            os.replace(temp, self.path)
+            if os.path.isfile(self.journal_path):
+                os.remove(self.journal_path)
+            self.dirty = False
+
+def get_cache_checksums():
+    global checksums
+    with state_lock:
+        if checksums is None:
+            checksums = ChecksumStore()
+        return checksums
+
+def save_cache_checksums():
+    if checksums is not None:
+        try:
+            checksums.flush()
+        except Exception as e:
+            cli.print(f"[red]Could not save checksum cache: {e}[/red]")
+
+def get_file_hash(file):
+    digest = get_cache_checksums().get(file)
+    if digest is None:
+        digest = hash_file(file)
+        get_cache_checksums().put(file, digest)
+    return digest
+
+def store_path(sha1):
+    return os.path.join(STORE_DIR, sha1[:2], sha1 + ".zip")
+
+def get_store_index():
+    global store_index
+    with store_lock:
+        if store_index is None:
+            store_index = dict()
+            if os.path.isfile(STORE_INDEX_FILE):
+                try:
+                    with open(STORE_INDEX_FILE) as f:
+                        store_index = json.load(f)
+                except:
+                    pass
+        return store_index
+
+def register_stored_file(file_name, sha1):
+    global store_dirty
+    index = get_store_index()
+    with store_lock:
+        if index.get(file_name) != sha1:
+            index[file_name] = sha1
+            store_dirty = True
+
+def save_store_index():
+    global store_dirty
+    with store_lock:
+        if not store_dirty or store_index is None:
+            return
+        try:
+            os.makedirs(STORE_DIR, exist_ok=True)
+            temp = STORE_INDEX_FILE + ".tmp"
+            with open(temp, "w") as f:
+                json.dump(store_index, f, separators=(",", ":"))
+            os.replace(temp, STORE_INDEX_FILE)
+            store_dirty = False
+        except Exception as e:
+            cli.print(f"[red]Could not save store index: {e}[/red]")
+
+def forget_stored_file(sha1):
+    global store_dirty
+    index = get_store_index()
+    with store_lock:
+        for file_name in [name for name, value in index.items() if value == sha1]:
+            del index[file_name]
+            store_dirty = True
+
+def find_cached_file(file_name):
+    sha1 = get_store_index().get(file_name)
+    if sha1 is not None and os.path.isfile(store_path(sha1)):
+        return store_path(sha1), sha1
+    legacy = os.path.join("mod_cache", file_name)
+    if os.path.isfile(legacy):
+        return legacy, None
+    return None, None
+
+class CacheManager:
+    def __init__(self, path=CACHE_USAGE_FILE):
+        self.path = path
+        self.usage = None
+        self.dirty = False
+        self.lock = threading.Lock()
+
+    def load(self):
+        if self.usage is not None:
+            return
+        self.usage = {"files": dict(), "hits": 0, "misses": 0, "evictions": 0, "evicted_bytes": 0}
+        if os.path.isfile(self.path):
+            try:
+                with open(self.path) as f:
+                    self.usage.update(json.load(f))
+            except:
+                pass
+
+    def save(self):
+        with self.lock:
+            if not self.dirty:
+                return
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            temp = self.path + ".tmp"
+            with open(temp, "w") as f:
+                json.dump(self.usage, f, separators=(",", ":"))
+            os.replace(temp, self.path)
+            self.dirty = False
+
+    def record_use(self, sha1, hit=None):
+        with self.lock:
+            self.load()
+            entry = self.usage["files"].setdefault(sha1, {"last_used": 0, "uses": 0})
+            entry["last_used"] = time.time()
+            entry["uses"] += 1
+            if hit is not None:
+                self.usage["hits" if hit else "misses"] += 1
+            self.dirty = True
+
+    def stored_files(self):
+        files = dict()
+        if not os.path.isdir(STORE_DIR):
+            return files
+        for root, _, names in os.walk(STORE_DIR):
+            for name in names:
+                if name.endswith(".zip") or ".zip.part" in name:
+                    path = os.path.join(root, name)
+                    files[path] = os.stat(path)
+        return files
+
+    def pinned(self, files):
+        known = set()
+        names = get_store_index()
+        pinned = set()
+        for mods_dir in known_mods_dirs():
+            if not os.path.isdir(mods_dir):
+                continue
+            for entry in os.scandir(mods_dir):
+                if not entry.name.endswith(".zip"):
+                    continue
+                if entry.name in names:
+                    pinned.add(names[entry.name])
+                try:
+                    st = entry.stat()
+                    known.add((st.st_dev, st.st_ino))
+                except OSError:
+                    pass
+        for path, st in files.items():
+            if (st.st_dev, st.st_ino) in known:
+                pinned.add(os.path.basename(path).split(".")[0])
+        return pinned
+
+    def stats(self):
+        files = self.stored_files()
+        pinned = self.pinned(files)
+        with self.lock:
+            self.load()
+            usage = dict(self.usage)
+        archives = [path for path in files if path.endswith(".zip")]
+        return {
+            "files": len(archives),
+            "size": sum(st.st_size for st in files.values()),
+            "partial_size": sum(st.st_size for path, st in files.items() if not path.endswith(".zip")),
+            "pinned": sum(1 for path in archives if os.path.basename(path)[:-4] in pinned),
+            "budget": core.cache_budget,
+            "policy": core.cache_policy,
+            "hits": usage["hits"],
+            "misses": usage["misses"],
+            "hit_rate": usage["hits"] / max(1, usage["hits"] + usage["misses"]),
+            "evictions": usage["evictions"],
+            "evicted_bytes": usage["evicted_bytes"]
+        }
+
+    def gc(self, budget=None, policy=None):
+        budget = budget if budget is not None else core.cache_budget
+        policy = policy or core.cache_policy
+        files = self.stored_files()
+        total = sum(st.st_size for st in files.values())
+        if total <= budget:
+            return []
+
+        pinned = self.pinned(files)
+        with self.lock:
+            self.load()
+            records = self.usage["files"]
+
+            def rank(item):
+                path, st = item
+                sha1 = os.path.basename(path).split(".")[0]
+                record = records.get(sha1, {"last_used": st.st_mtime, "uses": 0})
+                if policy == "lfu":
+                    return (record["uses"], record["last_used"])
+                return (record["last_used"], record["uses"])
+
+            candidates = sorted(((path, st) for path, st in files.items()
+                                 if os.path.basename(path).split(".")[0] not in pinned), key=rank)
+
+        evicted = []
+        for path, st in candidates:
+            if total <= budget:
+                break
+            sha1 = os.path.basename(path).split(".")[0]
+            with inflight_lock:
+                if sha1 in inflight_downloads:
+                    continue
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= st.st_size
+            evicted.append((path, st.st_size))
+            get_cache_checksums().discard(path)
+            if path.endswith(".zip"):
+                forget_stored_file(sha1)
+                with self.lock:
+                    records.pop(sha1, None)
+                    self.usage["evictions"] += 1
+                    self.usage["evicted_bytes"] += st.st_size
+                    self.dirty = True
+        return evicted
+
+def get_cache_manager():
+    global cache_manager
+    with state_lock:
+        if cache_manager is None:
+            cache_manager = CacheManager()
+        return cache_manager
+
+def save_cache_usage():
+    if cache_manager is not None:
+        try:
+            cache_manager.save()
+        except Exception as e:
+            cli.print(f"[red]Could not save cache usage: {e}[/red]")
+
+def known_mods_dirs():
+    dirs = []
+    if check_factorio_path_set():
+        dirs.append(os.path.join(core.factorio_path, "mods"))
+    for instance in get_instances().values():
+        mods_dir = os.path.join(instance["path"], "mods")
+        if mods_dir not in dirs:
+            dirs.append(mods_dir)
+    return dirs
+
+def enforce_cache_budget():
+    evicted = get_cache_manager().gc()
+    if evicted:
+        freed = sum(size for _, size in evicted)
+        cli.print(f"[yellow]Cache over budget, evicted {len(evicted)} files ({format_size(freed)})[/yellow]")
+    return evicted
@@ -0,0 +1,611 @@
+import json
+import os
+import platform
+import shutil
+import threading
+import time
+from packaging import version
+
+from . import core
+from .archive import read_archive, save_validation_cache, validate_archive
+from .core import IGNORED_MODS, MOD_FILE_PATTERN, cli, check_factorio_path_set, display_mod_info
+from .download import FALLBACK_MIRRORS, TransferCancelled, download_mod, mirror_url, save_mirror_stats
+from .portal import get_catalog, get_mod_info, is_error_packet
+from .resolver import RESOLVE_WORKERS, ResolutionError, release_versions, resolve_mods, root_dep
+from .store import enforce_cache_budget, find_cached_file, get_cache_checksums, get_cache_manager, get_file_hash, save_cache_checksums, save_cache_usage, save_store_index, store_path
+from .trace import span, trace_tag
+from .workers import INSTALL_WORKERS, cancel_tasks, get_worker_pool, offload, run_async
+
+INSTALLED_CACHE_FILE = os.path.join("mod_cache", "installed_mods.json")
+LOCK_FILE = "fmd-lock.json"
+LOCK_VERSION = 1
+FICLONE = 0x40049409
+
+DOWNLOAD_WORKERS = 4
+PIPELINE_QUEUE_SIZE = 32
+
+def flush_caches():
+    save_validation_cache()
+    save_cache_checksums()
+    save_store_index()
+    save_cache_usage()
+    save_mirror_stats()
+
+def select_release(mod_name, mod_info, ver):
+    _, releases = release_versions(mod_info.get("releases", []))
+    if not releases:
+        cli.print(f"[bold red]No matching releases found for {mod_name}[/bold red]")
+        return None
+
+    if not ver:
+        display_mod_info(mod_info)
+        while True:
+            cli.print("[bold green]Select release to download (default: latest): [/bold green]", end="")
+            inp = input().strip()
+            if inp == "":
+                ver = releases[-1]["version"]
+                break
+            if any(r["version"] == inp for r in releases):
+                ver = inp
+                break
+            cli.print("[bold red]!!! Version not found !!![/bold red]")
+    elif ver == "latest":
+        ver = releases[-1]["version"]
+
+    return next((r for r in releases if r["version"] == ver), None)
+
+class TransferProgress:
+    def __init__(self, progress, cancelled):
+        self.progress = progress
+        self.cancelled = cancelled
+
+    def add_expected(self, count):
+        if self.progress is not None:
+            self.progress.add_expected(count)
+
+    def add_bytes(self, count):
+        if self.cancelled.is_set():
+            raise TransferCancelled("Transfer cancelled")
+        if self.progress is not None:
+            self.progress.add_bytes(count)
+
+async def transfer_pipeline(resolved, infos, visited_set, progress=None, mods_dir=None, install_workers=INSTALL_WORKERS):
+    import asyncio
+    cancelled = threading.Event()
+    tracked = TransferProgress(progress, cancelled)
+    downloads = asyncio.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+    installs = asyncio.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+    statuses = dict()
+    started = time.monotonic()
+    stages = {"install_started": None}
+
+    async def produce():
+        for name, release in resolved:
+            visited_set[name] = None
+            await downloads.put((name, release))
+        for _ in range(DOWNLOAD_WORKERS):
+            await downloads.put(None)
+
+    async def download_worker():
+        while (item := await downloads.get()) is not None:
+            name, release = item
+            cli.print(f"Downloading {name} (v{release['version']})...")
+            try:
+                visited_set[name] = (await offload("io", download_mod, infos[name], ver=release["version"], progress=tracked))["file_name"]
+            except TransferCancelled:
+                raise
+            except Exception as e:
+                cli.print(f"[red]Failed to download {name}: {e}[/red]")
+            if progress is not None:
+                progress.downloaded(name, visited_set[name])
+            if mods_dir is not None and visited_set[name] is not None:
+                await installs.put(visited_set[name])
+
+    async def install_worker():
+        while (file_name := await installs.get()) is not None:
+            if stages["install_started"] is None:
+                stages["install_started"] = time.monotonic()
+            statuses[file_name] = await offload("disk", install_mod, file_name, mods_dir)
+
+    download_tasks = [asyncio.ensure_future(produce())] + [asyncio.ensure_future(download_worker()) for _ in range(DOWNLOAD_WORKERS)]
+    install_tasks = [asyncio.ensure_future(install_worker()) for _ in range(install_workers if mods_dir is not None else 0)]
+    try:
+        await asyncio.gather(*download_tasks)
+        downloaded = time.monotonic()
+        for _ in install_tasks:
+            await installs.put(None)
+        await asyncio.gather(*install_tasks)
+    except BaseException:
+        cancelled.set()
+        await cancel_tasks(download_tasks + install_tasks)
+        raise
+
+    finished = time.monotonic()
+    timings = {
+        "download": downloaded - started,
+        "install": finished - stages["install_started"] if stages["install_started"] is not None else 0.0
+    }
+    return statuses, timings
+
+def download_mods(roots, visited_set=None, min_delay=.05, workers=RESOLVE_WORKERS, infos=None, progress=None):
+    visited_set = visited_set if visited_set is not None else dict()
+    infos = infos if infos is not None else dict()
+    roots = [dep for dep in roots if dep.name not in visited_set]
+    for dep in roots:
+        if dep.name in IGNORED_MODS:
+            cli.print(f"[bold yellow]Skipping ignored mod: {dep.name}[/bold yellow]")
+    roots = [dep for dep in roots if dep.name not in IGNORED_MODS]
+    if not roots:
+        return visited_set
+
+    try:
+        resolved = resolve_mods(roots, infos=infos, skip=visited_set, min_delay=min_delay, workers=workers)
+    except ResolutionError as e:
+        cli.print(f"[bold red]Could not resolve dependencies:[/bold red] {e}")
+        for dep in roots:
+            visited_set[dep.name] = None
+        if progress is not None:
+            progress.failed(str(e))
+        return visited_set
+
+    if progress is not None:
+        progress.resolved([name for name, _ in resolved])
+
+    return download_resolved(resolved, infos, visited_set, progress)
+
+def fetch_resolved(resolved, infos, visited_set=None, progress=None, mods_dir=None):
+    visited_set = visited_set if visited_set is not None else dict()
+    try:
+        statuses, timings = run_async(transfer_pipeline(resolved, infos, visited_set, progress, mods_dir))
+    finally:
+        enforce_cache_budget()
+        flush_caches()
+    return visited_set, statuses, timings
+
+def download_resolved(resolved, infos, visited_set=None, progress=None):
+    return fetch_resolved(resolved, infos, visited_set, progress)[0]
+
+def download_recursive_mod(mod_name, ver="latest", visited_set=None, min_delay=.05, workers=RESOLVE_WORKERS):
+    visited_set = visited_set if visited_set is not None else dict()
+    infos = dict()
+
+    if not ver and mod_name not in IGNORED_MODS and mod_name not in visited_set:
+        infos[mod_name] = get_mod_info(mod_name, detailed=True)
+        if is_error_packet(infos[mod_name]):
+            cli.print(f"Could not download [bold red]{mod_name}[/bold red]: {infos[mod_name].get('message', 'Unknown Error')}")
+            visited_set[mod_name] = None
+            return visited_set
+        release = select_release(mod_name, infos[mod_name], ver)
+        if release is None:
+            visited_set[mod_name] = None
+            return visited_set
+        ver = release["version"]
+
+    return download_mods([root_dep(mod_name, ver)], visited_set=visited_set, min_delay=min_delay, workers=workers, infos=infos)
+
+def reflink_file(source, target):
+    import fcntl
+    with open(source, "rb") as src, open(target, "wb") as dst:
+        try:
+            fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+        except OSError:
+            dst.close()
+            os.remove(target)
+            raise
+
+def link_file(source, target, method="auto"):
+    if method in ("auto", "hardlink"):
+        try:
+            os.link(source, target)
+            return "hardlink"
+        except OSError:
+            if method == "hardlink":
+                raise
+    if method in ("auto", "reflink") and platform.system() == "Linux":
+        try:
+            reflink_file(source, target)
+            return "reflink"
+        except OSError:
+            if method == "reflink":
+                raise
+    if method == "symlink":
+        os.symlink(os.path.abspath(source), target)
+        return "symlink"
+    shutil.copyfile(source, target)
+    return "copy"
+
+def is_installed(source, sha1, target):
+    try:
+        if os.path.samefile(source, target):
+            return True
+        if sha1 is not None and os.path.getsize(source) == os.path.getsize(target):
+            return get_cache_checksums().get(target) == sha1
+    except OSError:
+        pass
+    return False
+
+def install_mod(filename, mods_dir=None):
+    if mods_dir is None:
+        if not check_factorio_path_set():
+            return None
+        mods_dir = os.path.join(core.factorio_path, "mods")
+
+    source, sha1 = find_cached_file(filename)
+    target = os.path.join(mods_dir, filename)
+    
+    os.makedirs(mods_dir, exist_ok=True)
+
+    with span("install_mod", file=filename) as current:
+        status, result = place_mod(source, sha1, target)
+        current.tag(status=status)
+    cli.print(f"[green]Installing {filename}... [/green]{result}")
+    return status
+
+def place_mod(source, sha1, target):
+    if source is None:
+        return "failed", "[bold red]Failed: not in cache[/bold red]"
+
+    if sha1 is None:
+        sha1 = get_file_hash(source)
+    else:
+        get_cache_manager().record_use(sha1)
+
+    errors, _ = validate_archive(source, sha1, os.path.basename(target))
+    if errors:
+        return "failed", f"[bold red]Failed: invalid archive ({'; '.join(errors)})[/bold red]"
+
+    if os.path.lexists(target) and is_installed(source, sha1, target):
+        return "present", "[bright_black]Already installed[/bright_black]"
+
+    temp = f"{target}.{threading.get_ident()}.tmp"
+    try:
+        if os.path.lexists(temp):
+            os.remove(temp)
+        method = link_file(source, temp, core.install_method)
+        trace_tag(method=method)
+        os.replace(temp, target)
+        if method in ("reflink", "copy"):
+            get_cache_checksums().put(target, sha1)
+        return "installed", f"[bold green]Done[/bold green] [bright_black]({method})[/bright_black]"
+    except Exception as e:
+        if os.path.lexists(temp):
+            os.remove(temp)
+        return "failed", f"[bold red]Failed: {e}[/bold red]"
+
+def install_set(visited_set, mods_dir=None, workers=INSTALL_WORKERS):
+    files_to_install = [val for val in visited_set.values() if val is not None]
+    if not files_to_install:
+        return dict()
+        
+    cli.print(f"\n[yellow]Installing {len(files_to_install)} mods...[/yellow]")
+    statuses = run_async(install_files(files_to_install, mods_dir, workers))
+    flush_caches()
+    return statuses
+
+async def install_files(files, mods_dir=None, workers=INSTALL_WORKERS):
+    import asyncio
+    semaphore = asyncio.Semaphore(workers)
+
+    async def install(file_name):
+        async with semaphore:
+            return await offload("disk", install_mod, file_name, mods_dir)
+
+    return dict(zip(files, await asyncio.gather(*(install(file_name) for file_name in files))))
+
+def scan_mods_dir(mods_dir):
+    installed = dict()
+    if not os.path.isdir(mods_dir):
+        return installed
+    for entry in os.scandir(mods_dir):
+        match = MOD_FILE_PATTERN.match(entry.name)
+        if match:
+            installed.setdefault(match.group(1), []).append((match.group(2), entry.name))
+    return installed
+
+def is_up_to_date(release, mods_dir):
+    target = os.path.join(mods_dir, release["file_name"])
+    if not os.path.isfile(target):
+        return False
+    stored = store_path(release["sha1"])
+    try:
+        if os.path.isfile(stored) and os.path.samefile(stored, target):
+            return True
+    except OSError:
+        pass
+    try:
+        return get_file_hash(target) == release["sha1"]
+    except OSError:
+        return False
+
+def remove_outdated(installed, resolved_files, mods_dir):
+    removed = []
+    for name, file_name in resolved_files.items():
+        for _, other in installed.get(name, []):
+            if other != file_name:
+                try:
+                    os.remove(os.path.join(mods_dir, other))
+                    removed.append(other)
+                except OSError as e:
+                    cli.print(f"[red]Could not remove {other}: {e}[/red]")
+    return removed
+
+def read_mod_list(path):
+    with open(path) as f:
+        mod_list = json.loads(f.read())
+    return [m["name"] for m in mod_list["mods"] if m.get("enabled", False) and m["name"] not in IGNORED_MODS]
+
+def sync_mods(mod_names, mods_dir=None, install=True, factorio_version=None):
+    mods_dir = mods_dir if mods_dir is not None else os.path.join(core.factorio_path, "mods")
+    timings = dict()
+    started = time.monotonic()
+
+    infos = dict()
+    try:
+        resolved = resolve_mods([root_dep(name) for name in mod_names], infos=infos, factorio_version=factorio_version)
+    except ResolutionError as e:
+        cli.print(f"[bold red]Could not resolve dependencies:[/bold red] {e}")
+        return None
+    timings["resolve"] = time.monotonic() - started
+
+    return apply_resolved(resolved, infos, mods_dir, install, timings, started)
+
+def apply_resolved(resolved, infos, mods_dir, install=True, timings=None, started=None):
+    timings = timings if timings is not None else dict()
+    started = started if started is not None else time.monotonic()
+    installed = scan_mods_dir(mods_dir) if install else dict()
+    pending = [(name, release) for name, release in resolved if not (install and is_up_to_date(release, mods_dir))]
+    cli.print(f"Resolved {len(resolved)} mods, {len(resolved) - len(pending)} already up to date, {len(pending)} to fetch.")
+
+    visited, statuses, stage_timings = fetch_resolved(pending, infos, mods_dir=mods_dir if install else None)
+    timings.update(stage_timings)
+
+    removed = []
+    if install:
+        resolved_files = {name: release["file_name"] for name, release in resolved}
+        removed = remove_outdated(installed, resolved_files, mods_dir)
+    timings["total"] = time.monotonic() - started
+
+    summary = {
+        "resolved": len(resolved),
+        "up_to_date": len(resolved) - len(pending),
+        "downloaded": sum(1 for file in visited.values() if file is not None),
+        "failed": [name for name, file in visited.items() if file is None] + [file for file, status in statuses.items() if status == "failed"],
+        "installed": sum(1 for status in statuses.values() if status == "installed"),
+        "removed": removed,
+        "timings": timings
+    }
+    display_sync_summary(summary)
+    return summary
+
+def lock_entry(name, release):
+    return {
+        "name": name,
+        "version": release["version"],
+        "file_name": release["file_name"],
+        "sha1": release["sha1"],
+        "urls": [mirror_url(mirror, name, release["version"]) for mirror in FALLBACK_MIRRORS]
+    }
+
+def write_lockfile(mod_names, path=LOCK_FILE, factorio_version=None):
+    infos = dict()
+    try:
+        resolved = resolve_mods([root_dep(name) for name in mod_names], infos=infos, factorio_version=factorio_version)
+    except ResolutionError as e:
+        cli.print(f"[bold red]Could not resolve dependencies:[/bold red] {e}")
+        return None
+
+    data = {
+        "lock_version": LOCK_VERSION,
+        "generated_at": time.time(),
+        "roots": sorted(mod_names),
+        "mods": sorted((lock_entry(name, release) for name, release in resolved), key=lambda mod: mod["name"])
+    }
+    temp = path + ".tmp"
+    with open(temp, "w") as f:
+        json.dump(data, f, indent=2)
+    os.replace(temp, path)
+    cli.print(f"[bold green]Locked {len(data['mods'])} mods in {path}[/bold green]")
+    return data
+
+def read_lockfile(path=LOCK_FILE):
+    with open(path) as f:
+        data = json.load(f)
+    if data.get("lock_version") != LOCK_VERSION:
+        raise ValueError(f"unsupported lockfile version {data.get('lock_version')}")
+
+    resolved = []
+    infos = dict()
+    for mod in data["mods"]:
+        release = {key: mod[key] for key in ("version", "file_name", "sha1")}
+        release["urls"] = mod.get("urls", [])
+        infos[mod["name"]] = {"name": mod["name"], "releases": [release]}
+        resolved.append((mod["name"], release))
+    return resolved, infos
+
+def install_locked(path=LOCK_FILE, mods_dir=None, install=True):
+    mods_dir = mods_dir if mods_dir is not None else os.path.join(core.factorio_path, "mods")
+    started = time.monotonic()
+    try:
+        resolved, infos = read_lockfile(path)
+    except (OSError, ValueError, KeyError) as e:
+        cli.print(f"[bold red]Could not read lockfile {path}:[/bold red] {e}")
+        return None
+    return apply_resolved(resolved, infos, mods_dir, install, {"resolve": time.monotonic() - started}, started)
+
+def read_info_json(path):
+    if os.path.isdir(path):
+        with open(os.path.join(path, "info.json"), encoding="utf-8") as f:
+            return json.load(f)
+    return read_archive(path)[0]
+
+def scan_installed_mods(mods_dir):
+    try:
+        with open(INSTALLED_CACHE_FILE) as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        cache = dict()
+
+    changed = False
+    installed = []
+    seen = set()
+    for entry in os.scandir(mods_dir) if os.path.isdir(mods_dir) else []:
+        if not (entry.name.endswith(".zip") or entry.is_dir()):
+            continue
+        path = os.path.abspath(entry.path)
+        try:
+            st = os.stat(os.path.join(path, "info.json") if entry.is_dir() else path)
+        except OSError:
+            continue
+        key = [st.st_size, st.st_mtime_ns]
+        seen.add(path)
+
+        cached = cache.get(path)
+        if cached is None or cached[:2] != key:
+            try:
+                info = read_info_json(path)
+                cached = key + [{
+                    "name": info["name"],
+                    "version": info["version"],
+                    "factorio_version": info.get("factorio_version"),
+                    "file": entry.name
+                }]
+            except Exception as e:
+                cached = key + [{"error": str(e), "file": entry.name}]
+            cache[path] = cached
+            changed = True
+        installed.append(cached[2])
+
+    for path in [path for path in cache if os.path.dirname(path) == os.path.abspath(mods_dir) and path not in seen]:
+        del cache[path]
+        changed = True
+
+    if changed:
+        try:
+            temp = INSTALLED_CACHE_FILE + ".tmp"
+            with open(temp, "w") as f:
+                json.dump(cache, f, separators=(",", ":"))
+            os.replace(temp, INSTALLED_CACHE_FILE)
+        except OSError:
+            pass
+    return installed
+
+def find_outdated(mods_dir):
+    installed = dict()
+    for mod in scan_installed_mods(mods_dir):
+        if "error" in mod or mod["name"] in IGNORED_MODS:
+            continue
+        try:
+            ver = version.parse(mod["version"])
+        except version.InvalidVersion:
+            continue
+        if mod["name"] not in installed or ver > installed[mod["name"]][0]:
+            installed[mod["name"]] = (ver, mod)
+
+    by_name = get_catalog().by_name
+    outdated = []
+    for name, (ver, mod) in sorted(installed.items()):
+        latest = by_name.get(name, dict()).get("latest_release")
+        if latest is None:
+            continue
+        try:
+            if version.parse(latest["version"]) > ver:
+                outdated.append((mod, latest))
+        except version.InvalidVersion:
+            continue
+    return outdated, [mod for _, mod in installed.values()]
+
+def installed_factorio_version(installed):
+    counts = dict()
+    for mod in installed:
+        if mod.get("factorio_version"):
+            counts[mod["factorio_version"]] = counts.get(mod["factorio_version"], 0) + 1
+    if not counts:
+        return None
+    return max(counts, key=lambda ver: (counts[ver], version.parse(ver)))
+
+def display_outdated(outdated, game_version):
+    from rich.table import Table
+    table = Table(title="[bold green]Outdated mods[/bold green]")
+    table.add_column("[green]Mod[/green]")
+    table.add_column("[green]Installed[/green]")
+    table.add_column("[green]Latest[/green]")
+    table.add_column("[green]Game Version[/green]")
+    for mod, latest in outdated:
+        latest_game = latest.get("info_json", {}).get("factorio_version", "Unknown")
+        game = latest_game if latest_game == game_version or game_version is None else f"[bold red]{latest_game}[/bold red]"
+        table.add_row(mod["name"], mod["version"], latest["version"], game)
+    cli.print(table)
+
+def validate_mods_dir(mods_dir, portal=False):
+    files = sorted(entry.name for entry in os.scandir(mods_dir) if entry.name.endswith(".zip") and entry.is_file()) if os.path.isdir(mods_dir) else []
+
+    def check(file_name):
+        path = os.path.join(mods_dir, file_name)
+        release = None
+        if portal:
+            match = MOD_FILE_PATTERN.match(file_name)
+            if match and match.group(1) not in IGNORED_MODS:
+                packet = get_mod_info(match.group(1), detailed=True, need_version=match.group(2))
+                if not is_error_packet(packet):
+                    release = next((r for r in packet.get("releases", []) if r["version"] == match.group(2)), None)
+        try:
+            errors, warnings = validate_archive(path, file_name=file_name, release=release)
+        except OSError as e:
+            errors, warnings = [str(e)], []
+        return file_name, errors, warnings
+
+    with span("validate_mods", files=len(files), portal=portal):
+        if portal:
+            results = list(get_worker_pool("io").map(check, files))
+        else:
+            results = [check(file_name) for file_name in files]
+    flush_caches()
+    return results
+
+def display_validation(results):
+    from rich.table import Table
+    table = Table(title="[bold green]Archive validation[/bold green]")
+    table.add_column("[green]File[/green]")
+    table.add_column("[green]Status[/green]")
+    table.add_column("[green]Details[/green]")
+    for file_name, errors, warnings in results:
+        if errors:
+            table.add_row(file_name, "[bold red]Invalid[/bold red]", "\n".join(errors + warnings))
+        elif warnings:
+            table.add_row(file_name, "[yellow]Warning[/yellow]", "\n".join(warnings))
+    invalid = sum(1 for _, errors, _ in results if errors)
+    if table.row_count:
+        cli.print(table)
+    cli.print(f"[bold green]Checked {len(results)} archives:[/bold green] {len(results) - invalid} valid, {invalid} invalid")
+
+def display_sync_summary(summary):
+    from rich.table import Table
+    table = Table(title="[bold green]Sync summary[/bold green]", show_header=False)
+    table.add_column()
+    table.add_column()
+    table.add_row("[green]Resolved[/green]", f"{summary['resolved']} mods in {summary['timings']['resolve']:.2f}s")
+    table.add_row("[green]Already up to date[/green]", str(summary["up_to_date"]))
+    table.add_row("[green]Fetched[/green]", f"{summary['downloaded']} in {summary['timings']['download']:.2f}s")
+    table.add_row("[green]Installed[/green]", f"{summary['installed']} in {summary['timings']['install']:.2f}s")
+    if summary["removed"]:
+        table.add_row("[green]Removed outdated[/green]", ", ".join(summary["removed"]))
+    if summary["failed"]:
+        table.add_row("[red]Failed[/red]", ", ".join(summary["failed"]))
+    table.add_row("[green]Total[/green]", f"{summary['timings']['total']:.2f}s")
+    cli.print(table)
+
+def import_mod_list(path, install=True):
+    if not os.path.isfile(path):
+        cli.print(f"[red]File {path} not found.[/red]")
+        return None
+
+    mods = read_mod_list(path)
+    cli.print(f"Found {len(mods)} enabled mods.")
+    summary = sync_mods(mods, install=install)
+
+    if summary is not None and install:
+        target_list = os.path.join(core.factorio_path, "mods", "mod-list.json")
+        if os.path.abspath(path) != os.path.abspath(target_list):
+            shutil.copy(path, target_list)
+            cli.print("[green]Updated mod-list.json in game folder.[/green]")
+    return summary
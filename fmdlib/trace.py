@@ -0,0 +1,122 @@
+import atexit
+import json
+import threading
+import time
+from contextlib import contextmanager
+
+from .core import cli, format_size
+
+trace_file = None
+trace_metrics = dict()
+trace_lock = threading.Lock()
+trace_local = threading.local()
+trace_ids = 0
+
+class Span:
+    def __init__(self, name, tags, parent=None):
+        global trace_ids
+        with trace_lock:
+            trace_ids += 1
+            self.id = trace_ids
+        self.name = name
+        self.tags = tags
+        self.parent = parent
+        self.bytes = 0
+        self.error = None
+        self.start = time.time()
+        self.duration = 0
+
+    def tag(self, **tags):
+        self.tags.update(tags)
+
+@contextmanager
+def span(name, **tags):
+    parent = getattr(trace_local, "span", None)
+    current = Span(name, tags, parent.id if parent is not None else None)
+    trace_local.span = current
+    started = time.perf_counter()
+    try:
+        yield current
+    except BaseException as e:
+        current.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        current.duration = time.perf_counter() - started
+        trace_local.span = parent
+        record_span(current)
+
+def trace_tag(**tags):
+    current = getattr(trace_local, "span", None)
+    if current is not None:
+        current.tag(**tags)
+
+def record_span(current):
+    with trace_lock:
+        metric = trace_metrics.get(current.name)
+        if metric is None:
+            metric = trace_metrics[current.name] = {"count": 0, "errors": 0, "seconds": 0.0, "max": 0.0, "bytes": 0, "cache": dict()}
+        metric["count"] += 1
+        metric["errors"] += current.error is not None
+        metric["seconds"] += current.duration
+        metric["max"] = max(metric["max"], current.duration)
+        metric["bytes"] += current.bytes
+        if "cache" in current.tags:
+            metric["cache"][current.tags["cache"]] = metric["cache"].get(current.tags["cache"], 0) + 1
+
+        if trace_file is not None:
+            record = {
+                "id": current.id,
+                "parent": current.parent,
+                "name": current.name,
+                "start": current.start,
+                "duration": current.duration,
+                "thread": threading.current_thread().name,
+                "bytes": current.bytes,
+                "tags": current.tags
+            }
+            if current.error is not None:
+                record["error"] = current.error
+            trace_file.write(json.dumps(record, default=str) + "\n")
+
+def get_trace_metrics():
+    with trace_lock:
+        return {name: dict(metric, cache=dict(metric["cache"])) for name, metric in trace_metrics.items()}
+
+def open_trace(path):
+    global trace_file
+    trace_file = open(path, "a", encoding="utf-8")
+    atexit.register(close_trace)
+
+def close_trace():
+    global trace_file
+    with trace_lock:
+        if trace_file is not None:
+            trace_file.close()
+            trace_file = None
+
+def display_trace_summary():
+    metrics = get_trace_metrics()
+    if not metrics:
+        return
+    from rich.table import Table
+    table = Table(title="[bold green]Trace summary[/bold green]")
+    table.add_column("[green]Span[/green]")
+    table.add_column("[green]Count[/green]", justify="right")
+    table.add_column("[green]Errors[/green]", justify="right")
+    table.add_column("[green]Total[/green]", justify="right")
+    table.add_column("[green]Avg[/green]", justify="right")
+    table.add_column("[green]Max[/green]", justify="right")
+    table.add_column("[green]Bytes[/green]", justify="right")
+    table.add_column("[green]Cache[/green]")
+    for name, metric in sorted(metrics.items(), key=lambda item: item[1]["seconds"], reverse=True):
+        table.add_row(
+            name,
+            str(metric["count"]),
+            str(metric["errors"]) if metric["errors"] else "",
+            f"{metric['seconds']:.2f}s",
+            f"{metric['seconds'] / metric['count'] * 1000:.1f}ms",
+            f"{metric['max'] * 1000:.1f}ms",
+            format_size(metric["bytes"]) if metric["bytes"] else "",
+            ", ".join(f"{key} {count}" for key, count in sorted(metric["cache"].items()))
+        )
+    cli.print(table)
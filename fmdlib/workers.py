@@ -0,0 +1,32 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from .core import state_lock
+
+INSTALL_WORKERS = 8
+
+WORKER_POOLS = {
+    "io": 16,
+    "disk": INSTALL_WORKERS
+}
+
+worker_pools = dict()
+
+def get_worker_pool(kind):
+    with state_lock:
+        if kind not in worker_pools:
+            worker_pools[kind] = ThreadPoolExecutor(max_workers=WORKER_POOLS[kind], thread_name_prefix=f"fmd-{kind}")
+        return worker_pools[kind]
+
+async def offload(kind, func, *args, **kwargs):
+    import asyncio
+    return await asyncio.get_running_loop().run_in_executor(get_worker_pool(kind), lambda: func(*args, **kwargs))
+
+def run_async(coro):
+    import asyncio
+    return asyncio.run(coro)
+
+async def cancel_tasks(tasks):
+    import asyncio
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
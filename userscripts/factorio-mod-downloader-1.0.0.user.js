@@ -1,7 +1,7 @@
 // ==UserScript==
 // @name         Factorio Mod Downloader
 // @namespace    http://tampermonkey.net/
-// @version      1.0.0
+// @version      1.1.0
 // @description  Extension replacement for the Factorio Mod Downloader
 // @author       kwimpcom
 // @match        https://mods.factorio.com/*
@@ -89,6 +89,39 @@
         return match ? match[1] : null;
     }
 
+    /* ----------------------------- */
+    /*          JOB POLLING          */
+    /* ----------------------------- */
+
+    const API_BASE = 'http://127.0.0.1:5000';
+    const POLL_INTERVAL = 500;
+
+    function formatBytes(bytes) {
+        if (bytes < 1024 * 1024) return `${Math.round(bytes / 1024)} KB`;
+        return `${(bytes / (1024 * 1024)).toFixed(1)} MB`;
+    }
+
+    function formatProgress(job) {
+        if (job.status === 'queued') return '⌛ Queued...';
+        if (job.status === 'resolving') return '⌛ Resolving...';
+        if (job.status === 'installing') return '⌛ Installing...';
+
+        let text = `⌛ ${job.mods_done}/${job.mods_total} · ${formatBytes(job.bytes)}`;
+        if (job.eta !== null) text += ` · ${Math.ceil(job.eta)}s`;
+        return text;
+    }
+
+    async function waitForJob(job, onProgress) {
+        while (job.status !== 'done' && job.status !== 'failed') {
+            onProgress(job);
+            await new Promise(resolve => setTimeout(resolve, POLL_INTERVAL));
+            const response = await fetch(`${API_BASE}/api/jobs/${job.id}`);
+            if (!response.ok) throw new Error('Job lost');
+            job = await response.json();
+        }
+        return job;
+    }
+
     /* ----------------------------- */
     /*        BUTTON CREATOR         */
     /* ----------------------------- */
@@ -118,13 +151,17 @@
 
             try {
                 const endpoint = version
-                ? `http://127.0.0.1:5000/api/download/${modName}/${version}`
-                : `http://127.0.0.1:5000/api/download/${modName}`;
+                ? `${API_BASE}/api/download/${modName}/${version}`
+                : `${API_BASE}/api/download/${modName}`;
 
-                const response = await fetch(endpoint);
+                const response = await fetch(endpoint, { method: 'POST' });
 
                 if (response.ok) {
-                    textSpan.textContent = '✅ Success!';
+                    const job = await waitForJob(await response.json(), (progress) => {
+                        textSpan.textContent = formatProgress(progress);
+                    });
+                    textSpan.textContent = job.status === 'done' ? '✅ Success!' : '❌ Error';
+                    if (job.status !== 'done') btn.title = job.message || '';
                 } else {
                     textSpan.textContent = '❌ Error';
                 }